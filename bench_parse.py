@@ -0,0 +1,92 @@
+import argparse
+import re
+import time
+
+from syntax import Parser, parse
+
+# A board's worth of typical lines, repeated to build very large inputs
+SAMPLE_LINES = [
+    '[text id={n}] content="Problem: Solve for the derivative of $x^3$" at=(50,{y}) color=darkred size=36',
+    '[math id={n}] content="$f(x) = x^3$" at=(50,{y}) color=blue size=32',
+    '[annotation id={n}] content="Step 1: Recall the rule: \\(\\frac{{d}}{{dx}}[x^n] = nx^{{n-1}}\\)" at=(50,{y}) color=darkgreen size=28',
+    '[math id={n}] content="\\(\\frac{{d}}{{dx}}[x^3] = 3x^2\\)" at=(50,{y}) color=purple size=32',
+    '[text id={n}] content="Answer: The derivative of $x^3$ is $3x^2$" at=(50,{y}) color=green size=34',
+    '[group id={n} at=(50,{y})]',
+    '[text id={n}] content="Extra Practice: Find the derivative of $x^4$" color=darkblue size=28',
+    '[annotation id={n}] content="Hint: Use the power rule" color=darkgrey size=26',
+    '[end group]',
+]
+
+
+def legacy_parse(syntax):
+    """The previous per-line regex parser, kept here as the benchmark baseline."""
+    elements = []
+    for line in syntax.strip().split("\n"):
+        if line.startswith("#") or not line.strip():
+            continue
+        if line.startswith("[group"):
+            group_attributes = {"type": "group"}
+            matches = re.findall(r'(\w+)=(".*?"|\(.*?\)|\S+)', line)
+            for key, value in matches:
+                if key == "at":
+                    value = tuple(map(int, value.strip("()").split(",")))
+                group_attributes[key] = value
+            elements.append(group_attributes)
+            continue
+        if line.startswith("[end group"):
+            elements.append({"type": "end group"})
+            continue
+        element_type_end = line.find(" ")
+        element_type = line[1:element_type_end]
+        attributes = {}
+        attributes_string = line[element_type_end + 1:]
+        matches = re.findall(r'(\w+)=(".*?"|\(.*?\)|\S+)', attributes_string)
+        for key, value in matches:
+            key = key.strip().lower()
+            if value.startswith('"') and value.endswith('"'):
+                value = value.strip('"')
+            elif value.startswith("(") and value.endswith(")"):
+                value = tuple(map(int, value.strip("()").split(",")))
+            elif value.isdigit():
+                value = int(value)
+            attributes[key] = value
+        attributes["type"] = element_type
+        elements.append(attributes)
+    return elements
+
+
+def make_board(lines):
+    return "\n".join(
+        SAMPLE_LINES[n % len(SAMPLE_LINES)].format(n=n, y=50 + 40 * n) for n in range(lines)
+    )
+
+
+def best_of(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def incremental(board):
+    parser = Parser()
+    for line in board.split("\n"):
+        parser.feed(line)
+    return parser.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Whiteboard Syntax parser against the legacy one.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 10000, 200000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'legacy ms':>10} {'parse ms':>10} {'feed ms':>10} {'speedup':>8}")
+    for lines in args.lines:
+        board = make_board(lines)
+        legacy = best_of(lambda: legacy_parse(board), args.repeat)
+        whole = best_of(lambda: parse(board), args.repeat)
+        fed = best_of(lambda: incremental(board), args.repeat)
+        print(f"{lines:>8} {legacy * 1000:>10.2f} {whole * 1000:>10.2f} {fed * 1000:>10.2f} {legacy / whole:>7.2f}x")
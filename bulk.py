@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import httpx
+from openai import AsyncOpenAI
+
+from gpt import (
+    PROMPT_LAYOUT, TOOL_CHOICE, TOOLS, backoff_delay, is_retryable, prompt_hash, syntax_from_message, syntax_messages,
+    usage_counts,
+)
+from response_cache import ResponseCache, normalize_text
+
+# Defaults for an overnight batch; tune them to the account's rate limits
+CONCURRENCY = 8
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 150000
+MAX_RETRIES = 6
+# Completion tokens reserved per request before the real usage is known
+EXPECTED_COMPLETION_TOKENS = 1000
+
+
+class RateLimiter:
+    """Token bucket holding up to per_minute units, refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()  # Waiters are served in arrival order
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)  # An oversized request must still get through eventually
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+    def debit(self, amount: float):
+        """Charge usage beyond what was reserved; later requests wait for it to refill."""
+        self._refill()
+        self.level -= amount
+
+
+def read_problems(path: str, field: str = "problem"):
+    """Problems from a JSONL file: each line is a JSON string or an object holding the problem under field.
+
+    A line without a problem is yielded with "error" set and no problem, so
+    the run reports it in place and carries on with the rest of the file.
+    """
+    with open(path, encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"index": index, "id": None, "problem": None, "error": f"Invalid JSON on line {index + 1}: {e}"}
+                continue
+            if isinstance(record, str):
+                yield {"index": index, "id": None, "problem": record}
+                continue
+            record_id = record.get("id", record.get("request_id")) if isinstance(record, dict) else None
+            problem = record.get(field) if isinstance(record, dict) else None
+            if isinstance(problem, str) and problem.strip():
+                yield {"index": index, "id": record_id, "problem": problem}
+            else:
+                error = f"No {field!r} text on line {index + 1}"
+                yield {"index": index, "id": record_id, "problem": None, "error": error}
+
+
+class AsyncWhiteboardGenerator:
+    """Asyncio counterpart of GPTWhiteboardGenerator for generating many whiteboards at once.
+
+    All requests share one pooled HTTP client. A semaphore caps requests in
+    flight, token buckets keep to the requests- and tokens-per-minute limits,
+    and 429/5xx responses are retried with jittered exponential backoff.
+    Results go through the same ResponseCache keys as the interactive
+    generator, so a bulk run pre-warms the app.
+    """
+
+    def __init__(self, api_key: str = None, cache: ResponseCache = None, model: str = "gpt-4o",
+                 temperature: float = 0.2, concurrency: int = CONCURRENCY,
+                 requests_per_minute: float = REQUESTS_PER_MINUTE, tokens_per_minute: float = TOKENS_PER_MINUTE,
+                 max_retries: int = MAX_RETRIES, client: AsyncOpenAI = None, layout: str = PROMPT_LAYOUT):
+        self._owns_client = client is None
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+                timeout=httpx.Timeout(120.0, connect=10.0),
+            )
+            # Retries are handled here so they share the backoff and rate limits
+            client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.temperature = temperature
+        self.layout = layout  # Must match the app's generator for its cache to be warmed
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.request_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        self.token_limiter = RateLimiter(tokens_per_minute) if tokens_per_minute else None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.usage = Counter()  # Token totals across all model calls
+        self.retries = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._owns_client:
+            await self.client.close()
+
+    async def generate_syntax(self, problem: str) -> str:
+        messages = syntax_messages(problem, self.layout)
+        key = ResponseCache.key("syntax", self.model, self.temperature, prompt_hash(messages), normalize_text(problem))
+        # SQLite calls block, so they run in a worker thread instead of stalling every request in flight
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+        syntax = await self._complete(messages)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, syntax)
+        return syntax
+
+    async def generate_many(self, problems, window: int = None):
+        """Generate a whiteboard per problem, yielding result dicts as they finish (not in input order).
+
+        problems may hold strings or read_problems() records and is consumed
+        lazily, at most window problems ahead of the finished ones. A failed
+        problem yields a result with "error" set instead of stopping the run.
+        """
+        window = window or self.concurrency * 2
+        pending = set()
+        try:
+            for index, item in enumerate(problems):
+                record = item if isinstance(item, dict) else {"index": index, "id": None, "problem": item}
+                pending.add(asyncio.ensure_future(self._run(record)))
+                if len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # The consumer stopped early; do not leave requests running
+            for task in pending:
+                task.cancel()
+
+    async def _run(self, record: dict) -> dict:
+        if record.get("error"):
+            return {**record, "syntax": None, "seconds": 0.0}  # A bad input row, reported as it was read
+        start = time.monotonic()
+        try:
+            syntax, error = await self.generate_syntax(record["problem"]), None
+        except Exception as e:
+            syntax, error = None, f"{type(e).__name__}: {e}"
+        return {**record, "syntax": syntax, "error": error, "seconds": round(time.monotonic() - start, 3)}
+
+    async def _complete(self, messages: list) -> str:
+        # Rough prompt size (about four characters per token) plus the expected completion
+        reserved = sum(len(message["content"]) for message in messages) // 4 + EXPECTED_COMPLETION_TOKENS
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                if self.request_limiter:
+                    await self.request_limiter.acquire()
+                if self.token_limiter:
+                    await self.token_limiter.acquire(reserved)
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        tools=TOOLS,
+                        tool_choice=TOOL_CHOICE,
+                        temperature=self.temperature,
+                    )
+                except Exception as e:
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        raise
+                    error = e
+                else:
+                    if response.usage is not None:
+                        counts = usage_counts(response.usage)
+                        self.usage["requests"] += 1
+                        self.usage.update(counts)
+                        used = counts["prompt_tokens"] + counts["completion_tokens"]
+                        if self.token_limiter and used > reserved:
+                            self.token_limiter.debit(used - reserved)
+                    return syntax_from_message(response.choices[0].message)
+            # Back off outside the semaphore so other requests keep the pool busy
+            self.retries += 1
+            await asyncio.sleep(backoff_delay(attempt, error))
+
+
+async def run(args):
+    cache = None if args.no_cache else ResponseCache()
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    generated = failed = 0
+    start = time.monotonic()
+    try:
+        async with AsyncWhiteboardGenerator(
+            api_key=os.getenv("OPENAI_API_KEY"), cache=cache, model=args.model, concurrency=args.concurrency,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm, max_retries=args.retries, layout=args.layout,
+        ) as generator:
+            async for result in generator.generate_many(read_problems(args.input, args.field)):
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                if result["error"]:
+                    failed += 1
+                    print(f"Problem {result['index']} failed: {result['error']}", file=sys.stderr)
+                else:
+                    generated += 1
+            print(
+                f"Generated {generated} whiteboards ({failed} failed) in {time.monotonic() - start:.1f}s, "
+                f"{generator.retries} retries, usage {dict(generator.usage)}",
+                file=sys.stderr,
+            )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate whiteboards for a JSONL file of problems.")
+    parser.add_argument("input", help="JSONL file with one problem per line")
+    parser.add_argument("-o", "--output", help="Append results as JSONL here instead of stdout")
+    parser.add_argument("--field", default="problem", help="Key holding the problem text in each JSON object")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE, help="Requests per minute (0 disables)")
+    parser.add_argument("--tpm", type=float, default=TOKENS_PER_MINUTE, help="Tokens per minute (0 disables)")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--layout", choices=["flow", "absolute"], default=PROMPT_LAYOUT,
+                        help="Prompt variant: flow leaves positions to the renderer, absolute asks for coordinates")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the response cache")
+    return asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import pygame
+from PIL import Image
+
+# Default encoder options per format; any of them can be overridden per call.
+# PNG is lossless for the final board; JPEG is several times cheaper and suits previews.
+ENCODINGS = {
+    "png": {"compress_level": 6},
+    "webp": {"quality": 80, "method": 4},
+    "jpeg": {"quality": 80},
+}
+
+# Formats without an alpha channel are flattened onto this color
+BACKGROUND = (255, 255, 255)
+
+# Encoded boards kept by a BoardExporter
+EXPORT_CACHE_ENTRIES = 32
+
+# PIL raw modes for the byte orders a 32-bit pygame surface can have, by (R, G, B, A) shifts
+_RAW_MODES = {
+    (16, 8, 0, 24): "BGRA",
+    (0, 8, 16, 24): "RGBA",
+    (8, 16, 24, 0): "ARGB",
+    (24, 16, 8, 0): "ABGR",
+}
+
+
+def surface_to_image(surface, rect=None):
+    """PIL RGBA image of rect within surface (all of it by default).
+
+    Reads the surface's pixel buffer in place, so only the rows and columns
+    inside rect are copied, once, into the image.
+    """
+    rect = surface.get_rect() if rect is None else pygame.Rect(rect).clip(surface.get_rect())
+    raw_mode = _RAW_MODES.get(surface.get_shifts()) if surface.get_bytesize() == 4 else None
+    if raw_mode is None or not surface.get_masks()[3]:
+        # Unusual pixel format: copy the rect into a standard one first
+        converted = pygame.Surface(rect.size, pygame.SRCALPHA)
+        converted.blit(surface, (0, 0), rect)
+        return surface_to_image(converted)
+    if not rect.width or not rect.height:
+        return Image.new("RGBA", rect.size)
+
+    pitch = surface.get_pitch()
+    start = rect.y * pitch + rect.x * 4
+    end = start + (rect.height - 1) * pitch + rect.width * 4  # The last row ends at the rect, not the pitch
+    with memoryview(surface.get_buffer()) as pixels:
+        # frombytes always decodes, so it copies the rect once; frombuffer would try to map an
+        # RGBA-order buffer in place and needs a full pitch for the last row
+        return Image.frombytes("RGBA", rect.size, pixels[start:end], "raw", raw_mode, pitch, 1)
+
+
+def encode(image, format="png", **options):
+    """Encode a PIL image as format ("png", "webp" or "jpeg"); options override ENCODINGS."""
+    format = format.lower()
+    options = {**ENCODINGS[format], **options}
+    if format == "jpeg" and image.mode != "RGB":
+        flat = Image.new("RGB", image.size, BACKGROUND)
+        flat.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = flat
+    buffer = io.BytesIO()
+    image.save(buffer, format=format.upper(), **options)
+    return buffer.getvalue()
+
+
+def export_surface(surface, format="png", rect=None, **options):
+    """Encoded bytes of rect within surface; see surface_to_image and encode."""
+    return encode(surface_to_image(surface, rect), format, **options)
+
+
+def pixel_digest(surface, rect=None):
+    """Digest of the pixels in rect, for recognizing a board drawn again unchanged."""
+    rect = surface.get_rect() if rect is None else pygame.Rect(rect).clip(surface.get_rect())
+    digest = hashlib.blake2b(repr((rect.size, surface.get_shifts())).encode("ascii"), digest_size=16)
+    pitch = surface.get_pitch()
+    row = rect.width * surface.get_bytesize()
+    with memoryview(surface.get_buffer()) as pixels:
+        if rect.x == 0 and row == pitch:
+            digest.update(pixels[rect.y * pitch:rect.bottom * pitch])
+        else:
+            for y in range(rect.y, rect.bottom):
+                start = y * pitch + rect.x * surface.get_bytesize()
+                digest.update(pixels[start:start + row])
+    return digest.hexdigest()
+
+
+class BoardExporter:
+    """Encodes boards and reuses the bytes of a board that has not changed.
+
+    A board is identified by a caller-supplied key, such as a digest of its
+    syntax, or by pixel_digest when no key is given. Encodings are kept per
+    (key, format, options) in an LRU of max_entries. Safe to share between
+    threads.
+    """
+
+    def __init__(self, max_entries=EXPORT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._encoded = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry(key, format, options):
+        return key, format.lower(), tuple(sorted(options.items()))
+
+    def cached(self, key, format="png", **options):
+        """Bytes encoded earlier for key, or None; lets callers skip drawing an unchanged board."""
+        entry = self._entry(key, format, options)
+        with self._lock:
+            data = self._encoded.get(entry)
+            if data is not None:
+                self._encoded.move_to_end(entry)
+                self.hits += 1
+            return data
+
+    def export(self, surface, format="png", rect=None, key=None, **options):
+        """Encoded bytes of rect within surface, reused when the same board was exported before."""
+        if key is None:
+            key = pixel_digest(surface, rect)
+        data = self.cached(key, format, **options)
+        if data is not None:
+            return data
+        data = export_surface(surface, format, rect, **options)
+        with self._lock:
+            self.misses += 1
+            self._encoded[self._entry(key, format, options)] = data
+            while len(self._encoded) > self.max_entries:
+                self._encoded.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._encoded.clear()
@@ -0,0 +1,192 @@
+import ast
+import io
+import tokenize
+from functools import lru_cache
+
+import numpy as np
+
+# Longest equation we are willing to parse; LLM output is never legitimately this long
+MAX_LENGTH = 500
+
+# Whitelisted numpy ufuncs, plus the spellings models commonly use for them
+FUNCTIONS = {
+    name: getattr(np, name)
+    for name in (
+        "sin", "cos", "tan", "arcsin", "arccos", "arctan", "arctan2",
+        "sinh", "cosh", "tanh", "arcsinh", "arccosh", "arctanh",
+        "exp", "exp2", "expm1", "log", "log2", "log10", "log1p",
+        "sqrt", "cbrt", "abs", "sign", "floor", "ceil", "round",
+        "minimum", "maximum", "hypot", "heaviside",
+    )
+}
+FUNCTIONS.update({
+    "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2,
+    "asinh": np.arcsinh, "acosh": np.arccosh, "atanh": np.arctanh,
+    "ln": np.log, "fabs": np.abs, "min": np.minimum, "max": np.maximum,
+})
+
+CONSTANTS = {"pi": np.pi, "e": np.e, "inf": np.inf}
+
+VARIABLE = "x"
+
+# Modules the model may prefix functions with, e.g. np.sin(x)
+_MODULE_PREFIXES = {"np", "numpy", "math"}
+
+_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _strip_module(node):
+    """Name of np.<name>/math.<name> attribute access, or None."""
+    if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and node.value.id in _MODULE_PREFIXES):
+        return node.attr
+    return None
+
+
+class _Normalizer(ast.NodeTransformer):
+    """Rejects anything outside the arithmetic whitelist and canonicalizes the rest."""
+
+    def __init__(self):
+        self.parameters = set()
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"Unsupported syntax in equation: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINARY_OPS):
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"Unsupported constant: {node.value!r}")
+        # Floats overflow to an error instead of building enormous Python ints (10**10**10)
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+    def visit_Name(self, node):
+        if node.id in FUNCTIONS:
+            raise ExpressionError(f"Function used without a call: {node.id}")
+        if node.id != VARIABLE and node.id not in CONSTANTS:
+            if node.id.startswith("_"):
+                raise ExpressionError(f"Invalid name: {node.id}")
+            self.parameters.add(node.id)
+        return node
+
+    def visit_Attribute(self, node):
+        if _strip_module(node) in CONSTANTS:
+            return ast.copy_location(ast.Name(node.attr, ast.Load()), node)
+        raise ExpressionError(f"Unsupported attribute: {ast.unparse(node)}")
+
+    def visit_Call(self, node):
+        if node.keywords:
+            raise ExpressionError("Keyword arguments are not supported")
+        func = node.func
+        if _strip_module(func) in FUNCTIONS:
+            func = ast.copy_location(ast.Name(func.attr, ast.Load()), func)
+        if not isinstance(func, ast.Name) or func.id not in FUNCTIONS:
+            raise ExpressionError(f"Unsupported function: {ast.unparse(node.func)}")
+        node.func = func
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+def _caret_to_power(source):
+    """source with every ^ operator spelled **; x^2 almost always means a power here.
+
+    Done on tokens rather than on the parsed tree so ^ also gets the precedence
+    of a power: x^2 + 1 is (x**2) + 1, not x**(2 + 1).
+    """
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    except tokenize.TokenError:
+        return source  # Unbalanced brackets; ast.parse reports them properly
+    return tokenize.untokenize(
+        (token.type, "**" if token.exact_type == tokenize.CIRCUMFLEX else token.string) for token in tokens
+    )
+
+
+class CompiledExpression:
+    """A validated equation compiled to a vectorized callable over numpy arrays."""
+
+    __slots__ = ("source", "parameters", "_code")
+
+    def __init__(self, source, parameters, code):
+        self.source = source
+        self.parameters = parameters
+        self._code = code
+
+    def __call__(self, x, **params):
+        missing = [name for name in self.parameters if name not in params]
+        if missing:
+            raise ExpressionError(f"Missing values for parameters: {', '.join(missing)}")
+        namespace = dict(FUNCTIONS)
+        namespace.update(CONSTANTS)
+        namespace.update(params)
+        namespace[VARIABLE] = x
+        try:
+            with np.errstate(all="ignore"):
+                result = eval(self._code, {"__builtins__": {}}, namespace)
+        except (OverflowError, ZeroDivisionError, TypeError, ValueError) as e:
+            raise ExpressionError(f"Could not evaluate {self.source!r}: {e}")
+        result = np.asarray(result, dtype=float)
+        # Constant equations such as "5" still produce one value per sample
+        shape = np.broadcast_shapes(result.shape, np.shape(x))
+        return np.broadcast_to(result, shape) if result.shape != shape else result
+
+
+@lru_cache(maxsize=256)
+def compile_expression(source):
+    """Parse, validate and compile an equation once; repeated equations hit the cache."""
+    if len(source) > MAX_LENGTH:
+        raise ExpressionError(f"Equation longer than {MAX_LENGTH} characters")
+    normalizer = _Normalizer()
+    try:
+        tree = ast.parse(_caret_to_power(source.strip()), mode="eval")
+        tree = ast.fix_missing_locations(normalizer.visit(tree))
+        code = compile(tree, "<equation>", "eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid equation {source!r}: {e.msg}")
+    except RecursionError:
+        raise ExpressionError(f"Equation nested too deeply: {source[:40]!r}...")
+    return CompiledExpression(source, tuple(sorted(normalizer.parameters)), code)
+
+
+def evaluate_many(equations, x, parameter_sets=None):
+    """Evaluate several equations against one shared x array in a batched pass.
+
+    Without parameter_sets the result has shape (len(equations), len(x)). With a
+    list of parameter dicts, each equation is evaluated once for all sets by
+    broadcasting, giving shape (len(equations), len(parameter_sets), len(x)).
+    """
+    x = np.asarray(x, dtype=float)
+    if not parameter_sets:
+        return np.stack([compile_expression(equation)(x) for equation in equations])
+
+    results = []
+    for equation in equations:
+        compiled = compile_expression(equation)
+        params = {
+            name: np.array([values[name] for values in parameter_sets], dtype=float)[:, None]
+            for name in compiled.parameters
+            if all(name in values for values in parameter_sets)
+        }
+        result = compiled(x[None, :], **params)
+        results.append(np.broadcast_to(result, (len(parameter_sets), x.size)))
+    return np.stack(results)
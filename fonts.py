@@ -0,0 +1,42 @@
+import threading
+
+import pygame
+
+from render_cache import SurfaceLRU
+
+# Memory budget for rendered text; text is cheap to redraw, so it is never written to disk
+TEXT_CACHE_BYTES = 32 * 1024 * 1024
+
+# pygame.font.Font reads and parses the font file on every call, so loaded fonts are kept by (face, size)
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+# Rendered text surfaces keyed by (face, text, size, color, antialias)
+text_cache = SurfaceLRU(TEXT_CACHE_BYTES)
+
+
+def get_font(size, face=None):
+    """Shared Font for a face (a font file path, or None for pygame's default) at a size."""
+    key = (face, int(size))
+    font = _fonts.get(key)
+    if font is None:
+        with _fonts_lock:
+            font = _fonts.get(key)
+            if font is None:
+                if not pygame.font.get_init():
+                    pygame.font.init()
+                font = _fonts[key] = pygame.font.Font(face, int(size))
+    return font
+
+
+def render_line(text, size, color, antialias=True, face=None):
+    """One line of text as a surface, reused from text_cache when it was drawn before.
+
+    The surface is shared between callers, so blit it rather than drawing on it.
+    """
+    key = (face, text, int(size), tuple(color), antialias)
+    surface = text_cache.get(key)
+    if surface is None:
+        surface = get_font(size, face).render(text, antialias, color)
+        text_cache.put(key, surface)
+    return surface
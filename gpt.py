@@ -1,25 +1,28 @@
 import os
 import json
-from openai import OpenAI
+import math
+import hashlib
+import itertools
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import httpx
+from openai import APIConnectionError, APIStatusError, OpenAI
 from dotenv import load_dotenv
+from response_cache import ResponseCache, normalize_text
+from patch import PatchError, apply_patch
+from local_tweaks import interpret_tweak
 
 # Load environment variables from .env file
 load_dotenv()
 API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=API_KEY)
-
-class GPTWhiteboardGenerator:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
-
-    def generate_syntax(self, problem: str) -> str:
-        """
-        Send problem to the assistant and get Whiteboard Syntax back using function calling.
-        """
-        try:
-            ai_prompt = """
+# Whiteboard Syntax reference shared by every request. It is always sent first and byte-for-byte
+# identical for a given layout, so the provider can cache it; the call-specific task follows it.
+# The parts that depend on who positions the elements are filled in per layout below.
+_PREFIX_OVERVIEW = """
 Your task is to generate Whiteboard Syntax that accurately represents the following problem.
 The syntax will be rendered on a virtual whiteboard, so your output must adhere to specific formatting rules to ensure a clean, visually appealing, and well-aligned presentation.
 
@@ -36,8 +39,9 @@ Supported Elements:
 Attributes:
 - id: A unique identifier for the element.
 - content: The main content of the element. For math, use LaTeX enclosed in $...$.
-- at: The position of the element, specified as a tuple (x, y).
-- color: Choose a color for the element from the provided palette.
+"""
+
+_PREFIX_PALETTE = """- color: Choose a color for the element from the provided palette.
 - size: The font size of the text or math.
 
 ---
@@ -49,15 +53,9 @@ The following colors are available for use. Select complementary and visually pl
 
 ---
 
-Positioning Rules:
-- Starting Position: The first element starts at (50, 50).
-- Spacing: To avoid overlap, add vertical spacing based on the font size:
-  spacing = size * 1.5
-- Alignment:
-  - Elements should align vertically unless grouped.
-  - Horizontal positions should avoid overlap by adjusting the x coordinate as needed.
-- Grouped Content: Place grouped elements at a distinct starting position (e.g., (50, 400)).
+"""
 
+_PREFIX_STRUCTURE = """
 ---
 
 Structure:
@@ -82,127 +80,11 @@ Structure:
 Examples:
 
 Example 1: Problem with Derivative
-[text id=1] content="Problem: Solve for the derivative of $x^3$" at=(50,50) color=darkred size=36
-[math id=2] content="$f(x) = x^3$" at=(50,120) color=blue size=32
-[annotation id=3] content="Step 1: Recall the rule: \\(\\frac{{d}}{{dx}}[x^n] = nx^{{n-1}}\\)" at=(50,200) color=darkgreen size=28
-[math id=4] content="\\(\\frac{{d}}{{dx}}[x^3] = 3x^2\\)" at=(50,260) color=purple size=32
-[text id=5] content="Answer: The derivative of $x^3$ is $3x^2$" at=(50,340) color=green size=34
-
-[group id=6 at=(50,420)]
-[text id=7] content="Extra Practice: Find the derivative of $x^4$" color=darkblue size=28
-[annotation id=8] content="Hint: Use the power rule: \\(\\frac{{d}}{{dx}}[x^n] = nx^{{n-1}}\\)" color=darkgrey size=26
-[end group]
-
----
-
-AI Task:
-When provided with a problem description, generate Whiteboard Syntax following these rules:
-- Ensure proper alignment (spacing vertically and horizontally).
-- Select colors from the palette to create a visually appealing theme.
-- Use appropriate font sizes for problem, steps, hints, and answers.
-- Structure the syntax clearly, with no overlapping elements.
-- Include optional hints or extra practice grouped at the bottom.
-
-Please return **only** the Whiteboard Syntax without any additional text or formatting.
 """
 
-            # Define the function that the model can call
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "generate_whiteboard_syntax",
-                        "description": "Generates Whiteboard Syntax for a given problem.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "whiteboard_syntax": {
-                                    "type": "string",
-                                    "description": "The generated Whiteboard Syntax representing the solution to the problem.",
-                                }
-                            },
-                            "required": ["whiteboard_syntax"],
-                        }
-                    }
-                }
-            ]
-
-            # Prepare the messages
-            messages = [
-                {"role": "system", "content": ai_prompt},
-                {"role": "user", "content": problem}
-            ]
-
-            # Make the API call using the client
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "generate_whiteboard_syntax"}},
-                temperature=0.2,
-            )
-
-            # Extract the assistant's message
-            message = response.choices[0].message
-
-            # Check if the assistant called the function
-            if message.tool_calls:
-                tool_call = message.tool_calls[0]
-                function_name = tool_call.function.name
-                function_args = tool_call.function.arguments
-                try:
-                    args = json.loads(function_args)
-                except json.JSONDecodeError:
-                    raise Exception(f"Invalid JSON in function arguments: {function_args}")
-                    syntax = None
-                syntax = args.get('whiteboard_syntax')
-                if syntax:
-                    return syntax
-                else:
-                    raise Exception("Function arguments did not contain 'whiteboard_syntax'")
-            else:
-                # Assistant didn't call the function, return the content
-                return message.content or ""
-
-        except Exception as e:
-            raise Exception(f"Error generating solution: {str(e)}")
-
-    def generate_tweak(self, problem: str, current_syntax: str, tweak: str) -> str:
-        """
-        Generate updated whiteboard syntax based on a user's tweak using function calling.
-        """
-        try:
-            ai_prompt = """
-Your task is to generate Whiteboard Syntax that accurately represents the following problem.
-The syntax will be rendered on a virtual whiteboard, so your output must adhere to specific formatting rules to ensure a clean, visually appealing, and well-aligned presentation.
-
----
-
-Whiteboard Syntax Overview:
-
-Supported Elements:
-- [text]: General text (e.g., problem descriptions, answers).
-- [math]: Mathematical expressions written in LaTeX for proper rendering.
-- [annotation]: Step-by-step annotations or explanations.
-- [group]: A container to organize related content like extra practice or hints.
-
-Attributes:
-- id: A unique identifier for the element.
-- content: The main content of the element. For math, use LaTeX enclosed in $...$.
-- at: The position of the element, specified as a tuple (x, y).
-- color: Choose a color for the element from the provided palette.
-- size: The font size of the text or math.
-
----
-
-Color Palette:
-The following colors are available for use. Select complementary and visually pleasing combinations:
-- red, green, blue, black, white, grey
-- darkred, darkgreen, purple, orange, darkblue, darkgrey
-
----
-
-Positioning Rules:
+# The model places every element with at=(x, y)
+PROMPT_PREFIX = _PREFIX_OVERVIEW + """- at: The position of the element, specified as a tuple (x, y).
+""" + _PREFIX_PALETTE + """Positioning Rules:
 - Starting Position: The first element starts at (50, 50).
 - Spacing: To avoid overlap, add vertical spacing based on the font size:
   spacing = size * 1.5
@@ -210,45 +92,60 @@ Positioning Rules:
   - Elements should align vertically unless grouped.
   - Horizontal positions should avoid overlap by adjusting the x coordinate as needed.
 - Grouped Content: Place grouped elements at a distinct starting position (e.g., (50, 400)).
+""" + _PREFIX_STRUCTURE + """[text id=1] content="Problem: Solve for the derivative of $x^3$" at=(50,50) color=darkred size=36
+[math id=2] content="$f(x) = x^3$" at=(50,120) color=blue size=32
+[annotation id=3] content="Step 1: Recall the rule: \\(\\frac{d}{dx}[x^n] = nx^{n-1}\\)" at=(50,200) color=darkgreen size=28
+[math id=4] content="\\(\\frac{d}{dx}[x^3] = 3x^2\\)" at=(50,260) color=purple size=32
+[text id=5] content="Answer: The derivative of $x^3$ is $3x^2$" at=(50,340) color=green size=34
 
----
-
-Structure:
-1. Problem Description:
-   - Begin with a [text] or [math] element describing the problem.
-   - Use a large font size (e.g., size = 36).
-   - Example: [text] content="Problem: Solve for the derivative of $x^3$"
+[group id=6 at=(50,420)]
+[text id=7] content="Extra Practice: Find the derivative of $x^4$" color=darkblue size=28
+[annotation id=8] content="Hint: Use the power rule: \\(\\frac{d}{dx}[x^n] = nx^{n-1}\\)" color=darkgrey size=26
+[end group]
 
-2. Steps:
-   - Use [annotation] to explain each step.
-   - Use [math] to show equations or mathematical expressions.
+---
 
-3. Solution:
-   - Conclude with a [text] or [math] element for the solution.
-   - Highlight the answer using a visually distinct color (e.g., green or blue).
+"""
 
-4. Hints or Extra Practice:
-   - Group hints or additional problems in a [group] element for clarity.
+# The renderer stacks elements in order (render.layout in "flow" mode), so no coordinates are generated
+FLOW_PROMPT_PREFIX = _PREFIX_OVERVIEW + _PREFIX_PALETTE + """Layout Rules:
+- Do not write at=(x, y) on any element; the whiteboard positions elements automatically.
+- Elements are stacked top to bottom in the order they are written, so write them in reading order.
+- A [group] is placed as one block below the elements before it, with its members stacked inside it.
+- To move an element, change where it appears in the order.
+""" + _PREFIX_STRUCTURE + """[text id=1] content="Problem: Solve for the derivative of $x^3$" color=darkred size=36
+[math id=2] content="$f(x) = x^3$" color=blue size=32
+[annotation id=3] content="Step 1: Recall the rule: \\(\\frac{d}{dx}[x^n] = nx^{n-1}\\)" color=darkgreen size=28
+[math id=4] content="\\(\\frac{d}{dx}[x^3] = 3x^2\\)" color=purple size=32
+[text id=5] content="Answer: The derivative of $x^3$ is $3x^2$" color=green size=34
+
+[group id=6]
+[text id=7] content="Extra Practice: Find the derivative of $x^4$" color=darkblue size=28
+[annotation id=8] content="Hint: Use the power rule: \\(\\frac{d}{dx}[x^n] = nx^{n-1}\\)" color=darkgrey size=26
+[end group]
 
 ---
 
-Examples:
+"""
 
-Example 1: Problem with Derivative
-[text id=1] content="Problem: Solve for the derivative of $x^3$" at=(50,50) color=darkred size=36
-[math id=2] content="$f(x) = x^3$" at=(50,120) color=blue size=32
-[annotation id=3] content="Step 1: Recall the rule: \\(\\frac{{d}}{{dx}}[x^n] = nx^{{n-1}}\\)" at=(50,200) color=darkgreen size=28
-[math id=4] content="\\(\\frac{{d}}{{dx}}[x^3] = 3x^2\\)" at=(50,260) color=purple size=32
-[text id=5] content="Answer: The derivative of $x^3$ is $3x^2$" at=(50,340) color=green size=34
+PROMPT_PREFIXES = {"absolute": PROMPT_PREFIX, "flow": FLOW_PROMPT_PREFIX}
+# Which reference new boards are generated with; "flow" leaves positioning to the renderer
+PROMPT_LAYOUT = os.getenv("WHITEBOARD_PROMPT_LAYOUT", "flow")
 
-[group id=6 at=(50,420)]
-[text id=7] content="Extra Practice: Find the derivative of $x^4$" color=darkblue size=28
-[annotation id=8] content="Hint: Use the power rule: \\(\\frac{{d}}{{dx}}[x^n] = nx^{{n-1}}\\)" color=darkgrey size=26
-[end group]
+# Task for generating a whiteboard from a problem description
+SYNTAX_TASK = """AI Task:
+When provided with a problem description, generate Whiteboard Syntax following these rules:
+- Ensure proper alignment (spacing vertically and horizontally).
+- Select colors from the palette to create a visually appealing theme.
+- Use appropriate font sizes for problem, steps, hints, and answers.
+- Structure the syntax clearly, with no overlapping elements.
+- Include optional hints or extra practice grouped at the bottom.
 
----
+Please return **only** the Whiteboard Syntax without any additional text or formatting.
+"""
 
-AI Task:
+# Task for applying a user's tweak to an existing whiteboard
+TWEAK_TASK = """AI Task:
 When provided with a problem description, current whiteboard syntax, and a user's tweak, generate updated Whiteboard Syntax following these rules:
 - Apply the user's tweak to the current syntax, ensuring the tweak is accurately reflected.
 - Maintain proper alignment and formatting, adjusting positions as necessary.
@@ -259,33 +156,114 @@ When provided with a problem description, current whiteboard syntax, and a user'
 Please return **only** the updated Whiteboard Syntax without any additional text or formatting.
 """
 
-            # Define the function that the model can call
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "generate_whiteboard_syntax",
-                        "description": "Generates updated Whiteboard Syntax based on the user's tweak.",
-                        "parameters": {
+# Tweak task for flow boards, where order is position and at=(x, y) is ignored by the renderer
+FLOW_TWEAK_TASK = """AI Task:
+When provided with a problem description, current whiteboard syntax, and a user's tweak, generate updated Whiteboard Syntax following these rules:
+- Apply the user's tweak to the current syntax, ensuring the tweak is accurately reflected.
+- Never write at=(x, y); elements are positioned by their order.
+- To move an element, change where it appears in the order, keeping group members inside their group.
+- Use colors from the palette to create a visually appealing theme.
+- Include optional hints or extra practice grouped at the bottom.
+
+Please return **only** the updated Whiteboard Syntax without any additional text or formatting.
+"""
+
+TWEAK_TASKS = {"absolute": TWEAK_TASK, "flow": FLOW_TWEAK_TASK}
+
+# Task for returning a tweak as edit operations instead of a whole new board
+PATCH_TASK = """AI Task:
+When provided with a problem description, current whiteboard syntax, and a user's tweak, return the smallest list of edit operations that applies the tweak:
+- set: change one attribute of an element, e.g. {"op": "set", "id": "5", "attr": "color", "value": "red"} or {"op": "set", "id": "5", "attr": "at", "value": "(50,380)"}.
+- replace_content: replace the content of an element, e.g. {"op": "replace_content", "id": "4", "content": "$x = 2$"}.
+- insert_after: insert new Whiteboard Syntax lines after an element, e.g. {"op": "insert_after", "id": "4", "line": "[math id=12] content=\"$x = 3$\" at=(50,300) color=purple size=32"}. New elements need unique ids.
+- delete: remove an element, or a whole group when given the group's id, e.g. {"op": "delete", "id": "6"}.
+- Refer to elements only by their existing ids, and keep positions free of overlaps.
+- Never repeat elements that the tweak does not change.
+"""
+
+# Patch task for flow boards, where order is position and at=(x, y) is ignored by the renderer
+FLOW_PATCH_TASK = """AI Task:
+When provided with a problem description, current whiteboard syntax, and a user's tweak, return the smallest list of edit operations that applies the tweak:
+- set: change one attribute of an element, e.g. {"op": "set", "id": "5", "attr": "color", "value": "red"}. Never set at; elements are positioned by their order.
+- replace_content: replace the content of an element, e.g. {"op": "replace_content", "id": "4", "content": "$x = 2$"}.
+- insert_after: insert new Whiteboard Syntax lines after an element, e.g. {"op": "insert_after", "id": "4", "line": "[math id=12] content=\"$x = 3$\" color=purple size=32"}. New elements need unique ids.
+- delete: remove an element, or a whole group when given the group's id, e.g. {"op": "delete", "id": "6"}.
+- To move an element, delete it and insert_after the element it should follow, with a new id.
+- Refer to elements only by their existing ids.
+- Never repeat elements that the tweak does not change.
+"""
+
+PATCH_TASKS = {"absolute": PATCH_TASK, "flow": FLOW_PATCH_TASK}
+
+# Every request offers the same functions, keeping the cached prefix stable; tool_choice picks one
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "generate_whiteboard_syntax",
+            "description": "Generates Whiteboard Syntax for a problem, or updated Whiteboard Syntax after applying the user's tweak.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "whiteboard_syntax": {
+                        "type": "string",
+                        "description": "The complete Whiteboard Syntax for the board.",
+                    }
+                },
+                "required": ["whiteboard_syntax"],
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "edit_whiteboard",
+            "description": "Applies the user's tweak as edit operations on the current Whiteboard Syntax.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "operations": {
+                        "type": "array",
+                        "items": {
                             "type": "object",
                             "properties": {
-                                "whiteboard_syntax": {
-                                    "type": "string",
-                                    "description": "The updated Whiteboard Syntax after applying the user's tweak.",
-                                }
+                                "op": {"type": "string", "enum": ["set", "insert_after", "delete", "replace_content"]},
+                                "id": {"type": "string", "description": "Id of the element to edit."},
+                                "attr": {"type": "string", "description": "Attribute to change (set)."},
+                                "value": {"type": "string", "description": "New attribute value (set)."},
+                                "content": {"type": "string", "description": "New content (replace_content)."},
+                                "line": {"type": "string", "description": "Whiteboard Syntax to insert (insert_after)."},
                             },
-                            "required": ["whiteboard_syntax"],
-                        }
+                            "required": ["op", "id"],
+                        },
                     }
-                }
-            ]
-
-            # Prepare the messages
-            messages = [
-                {"role": "system", "content": ai_prompt},
-                {
-                    "role": "user",
-                    "content": f"""
+                },
+                "required": ["operations"],
+            }
+        }
+    },
+]
+
+TOOL_CHOICE = {"type": "function", "function": {"name": "generate_whiteboard_syntax"}}
+EDIT_TOOL_CHOICE = {"type": "function", "function": {"name": "edit_whiteboard"}}
+
+
+def syntax_messages(problem: str, layout: str = PROMPT_LAYOUT) -> list:
+    return [
+        {"role": "system", "content": PROMPT_PREFIXES[layout]},
+        {"role": "system", "content": SYNTAX_TASK},
+        {"role": "user", "content": problem}
+    ]
+
+
+def tweak_messages(problem: str, current_syntax: str, tweak: str, task: str = TWEAK_TASK,
+                   layout: str = PROMPT_LAYOUT) -> list:
+    return [
+        {"role": "system", "content": PROMPT_PREFIXES[layout]},
+        {"role": "system", "content": task},
+        {
+            "role": "user",
+            "content": f"""
 Problem Description:
 {problem}
 
@@ -295,44 +273,597 @@ Current Whiteboard Syntax:
 User's Tweak:
 {tweak}
 """
-                }
-            ]
-
-            # Make the API call using the client
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "generate_whiteboard_syntax"}},
-                temperature=0.2,
-            )
-
-            # Extract the assistant's message
-            message = response.choices[0].message
-            
-            # Check if the assistant called the function
-            if message.tool_calls:
-                tool_call = message.tool_calls[0]
-                function_name = tool_call.function.name
-                function_args = tool_call.function.arguments
-                try:
-                    args = json.loads(function_args)
-                except json.JSONDecodeError:
-                    raise Exception(f"Invalid JSON in function arguments: {function_args}")
-                    syntax = None
-                syntax = args.get('whiteboard_syntax')
-                if syntax:
-                    print(syntax)
-                    return syntax
-                else:
-                    raise Exception("Function arguments did not contain 'whiteboard_syntax'")
+        }
+    ]
+
+
+def prompt_hash(messages: list) -> str:
+    """Hash of the prompt template and tool schema; changing either invalidates cached responses."""
+    system = "".join(message["content"] for message in messages if message["role"] == "system")
+    template = system + json.dumps(TOOLS, sort_keys=True)
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+def syntax_from_message(message) -> str:
+    """Whiteboard Syntax from a completed assistant message."""
+    # Check if the assistant called the function
+    if message.tool_calls:
+        tool_call = message.tool_calls[0]
+        function_args = tool_call.function.arguments
+        try:
+            args = json.loads(function_args)
+        except json.JSONDecodeError:
+            raise Exception(f"Invalid JSON in function arguments: {function_args}")
+        syntax = args.get('whiteboard_syntax')
+        if syntax:
+            return syntax
+        else:
+            raise Exception("Function arguments did not contain 'whiteboard_syntax'")
+    else:
+        # Assistant didn't call the function, return the content
+        return message.content or ""
+
+
+def usage_counts(usage) -> dict:
+    """Prompt, cached and completion token counts from a response's usage."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+    }
+
+
+# Statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRY_STATUSES = {408, 409, 429}
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIConnectionError):  # Includes timeouts
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUSES or error.status_code >= 500
+    return False
+
+
+BACKOFF_BASE = 1.0  # Seconds before the first retry, doubled on each further attempt
+BACKOFF_CAP = 60.0
+
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    """Exponential backoff with full jitter, honouring a Retry-After header when the server sends one."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay  # Retry-After given as an HTTP date
+
+
+def _in_thread(function, *args) -> Future:
+    """Run function in a daemon thread, so an abandoned request never delays interpreter exit."""
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+# Whether model calls are hedged by default; duplicates cost tokens, so it is opt-in
+HEDGE = os.getenv("WHITEBOARD_HEDGE", "0") == "1"
+
+
+class LatencyPolicy:
+    """Timeouts, an overall deadline and optional hedging for model calls.
+
+    Each attempt gets a connect timeout, capped by the time left before the
+    deadline. Streamed attempts also get a per-read timeout, so a stream that
+    goes quiet fails fast; a blocking completion sends nothing until the whole
+    response is ready, so its reads may take until the deadline. A hedged
+    call sends a duplicate request once the first has run longer than the
+    recent p95 latency of that kind of call, and takes whichever answers
+    first. A retryable failure is retried after backoff_delay (at least the
+    server's Retry-After) while attempts and time remain.
+
+    Hedging is off unless enabled (hedge=True or WHITEBOARD_HEDGE=1): a losing
+    blocking attempt cannot be cancelled, so it still runs to the end and is billed.
+    """
+
+    def __init__(self, deadline: float = 90.0, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 hedge: bool = None, hedge_delay: float = None, hedge_percentile: float = 95,
+                 min_hedge_delay: float = 0.5, min_samples: int = 5, max_attempts: int = 2, history: int = 100):
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.hedge = HEDGE if hedge is None else hedge
+        self.hedge_delay = hedge_delay  # Fixed delay; None derives it from recent latencies
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self.history = history
+        self._samples = {}  # Call kind -> recent latencies of successful attempts
+        self._lock = threading.Lock()
+
+    def timeout(self, remaining: float, streamed: bool = False) -> httpx.Timeout:
+        remaining = max(remaining, 0.001)
+        read = min(self.read_timeout, remaining) if streamed else remaining
+        return httpx.Timeout(read, connect=min(self.connect_timeout, remaining))
+
+    def hedge_after(self, kind: str):
+        """Seconds to wait before sending a duplicate request, or None not to hedge."""
+        if not self.hedge:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            samples = sorted(self._samples.get(kind, ()))
+        if len(samples) < self.min_samples:
+            return None  # No baseline yet
+        index = max(math.ceil(len(samples) * self.hedge_percentile / 100) - 1, 0)
+        return max(samples[index], self.min_hedge_delay)
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self.history)).append(seconds)
+
+
+class SyntaxStreamDecoder:
+    """Incrementally decodes streamed tool-call arguments into whiteboard syntax lines.
+
+    The arguments arrive as fragments of the JSON object
+    {"whiteboard_syntax": "..."}; feed() decodes the string value as it
+    grows and returns each line as soon as its newline has arrived.
+    """
+
+    KEY = '"whiteboard_syntax"'
+
+    def __init__(self):
+        self._raw = ""  # Undecoded input
+        self._in_value = False
+        self._done = False
+        self._line = []
+
+    def feed(self, fragment: str) -> list:
+        """Consume a fragment of the arguments JSON; returns the newly completed lines."""
+        if self._done:
+            return []
+        self._raw += fragment
+        if not self._in_value and not self._find_value():
+            return []
+
+        lines = []
+        raw = self._raw
+        i = 0
+        while i < len(raw):
+            char = raw[i]
+            if char == '"':
+                self._done = True
+                break
+            if char == "\\":
+                escape = self._escape_length(raw, i)
+                if escape is None:
+                    break  # Escape split across fragments; wait for the rest
+                char = json.loads('"' + raw[i:i + escape] + '"')
+                i += escape
+            else:
+                i += 1
+            if char == "\n":
+                lines.append("".join(self._line))
+                self._line = []
             else:
-                # Assistant didn't call the function, return the content
-                return message.content or ""
+                self._line.append(char)
+        self._raw = raw[i:]
+        return lines
+
+    def close(self) -> list:
+        """Flush the final line once the stream has ended."""
+        line = "".join(self._line)
+        self._line = []
+        return [line] if line.strip() else []
+
+    def _find_value(self) -> bool:
+        key = self._raw.find(self.KEY)
+        if key < 0:
+            return False
+        rest = self._raw[key + len(self.KEY):].lstrip()
+        if not rest.startswith(":"):
+            return False
+        rest = rest[1:].lstrip()
+        if not rest.startswith('"'):
+            return False
+        self._raw = rest[1:]
+        self._in_value = True
+        return True
+
+    @staticmethod
+    def _escape_length(raw: str, i: int):
+        """Length of the escape sequence at raw[i], or None if it is still incomplete."""
+        if i + 1 >= len(raw):
+            return None
+        if raw[i + 1] != "u":
+            return 2
+        if i + 6 > len(raw):
+            return None
+        # A high surrogate is only decodable together with the low surrogate that follows
+        if 0xD800 <= int(raw[i + 2:i + 6], 16) < 0xDC00:
+            return 12 if i + 12 <= len(raw) else None
+        return 6
+
+
+class GPTWhiteboardGenerator:
+    def __init__(self, api_key: str = None, cache: ResponseCache = None, model: str = "gpt-4o",
+                 temperature: float = 0.2, tweak_mode: str = "patch", client: OpenAI = None,
+                 latency: LatencyPolicy = None, base_url: str = None, layout: str = PROMPT_LAYOUT):
+        # Pass a client to share its connection pool; retries are left to the latency policy
+        self.client = client or OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.latency = latency or LatencyPolicy()
+        self.last_attempts = []  # Timing of each attempt of the most recent model call
+        self.hedges = Counter()  # Hedged requests sent, and how many of them won
+        self.cache = cache  # Optional ResponseCache; None always calls the model
+        self.model = model
+        self.temperature = temperature
+        self.tweak_mode = tweak_mode  # "patch" asks for edit operations, "full" for the whole board
+        self.layout = layout  # "flow" leaves positions to the renderer, "absolute" has the model write at=(x, y)
+        self.tweak_paths = Counter()  # How many tweaks took each path; stream_tweak returns the path of one
+        self.last_usage = None  # Token counts of the most recent model call
+        self.usage = Counter()  # Token totals across all model calls
+
+    def generate_syntax(self, problem: str) -> str:
+        """
+        Send problem to the assistant and get Whiteboard Syntax back using function calling.
+        """
+        try:
+            messages = syntax_messages(problem, self.layout)
+            key = self._cache_key("syntax", messages, normalize_text(problem))
+            return self._cached(key, lambda: self._complete(messages))
+        except Exception as e:
+            raise Exception(f"Error generating solution: {str(e)}")
+
+    def generate_tweak(self, problem: str, current_syntax: str, tweak: str) -> str:
+        """
+        Generate updated whiteboard syntax based on a user's tweak using function calling.
+        """
+        try:
+            syntax, _ = self._quick_tweak(problem, current_syntax, tweak)
+            if syntax is not None:
+                return syntax
+            self._record_tweak_path("full")
+            messages = tweak_messages(problem, current_syntax, tweak, task=TWEAK_TASKS[self.layout], layout=self.layout)
+            key = self._tweak_cache_key(messages, problem, current_syntax, tweak)
+            return self._cached(key, lambda: self._complete(messages))
+        except Exception as e:
+            raise Exception(f"Error generating updated syntax: {str(e)}")
+
+    def stream_syntax(self, problem: str):
+        """
+        Like generate_syntax, but yields each Whiteboard Syntax line as soon as it is generated.
+        """
+        try:
+            messages = syntax_messages(problem, self.layout)
+            key = self._cache_key("syntax", messages, normalize_text(problem))
+            yield from self._cached_stream(key, self._stream(messages))
+        except Exception as e:
+            raise Exception(f"Error generating solution: {str(e)}")
 
+    def stream_tweak(self, problem: str, current_syntax: str, tweak: str):
+        """
+        Like generate_tweak, but yields each updated Whiteboard Syntax line as soon as it is generated.
+        Returns the path the tweak took ("local", "patch" or "full") as the generator's value.
+        """
+        try:
+            # Local and patched tweaks are short edits, so they are applied whole rather than streamed
+            syntax, path = self._quick_tweak(problem, current_syntax, tweak)
+            if syntax is not None:
+                yield from syntax.split("\n")
+                return path
+            self._record_tweak_path("full")
+            messages = tweak_messages(problem, current_syntax, tweak, task=TWEAK_TASKS[self.layout], layout=self.layout)
+            key = self._tweak_cache_key(messages, problem, current_syntax, tweak)
+            yield from self._cached_stream(key, self._stream(messages))
+            return "full"
         except Exception as e:
             raise Exception(f"Error generating updated syntax: {str(e)}")
 
+    def _cache_key(self, kind: str, messages: list, *inputs) -> str:
+        return ResponseCache.key(kind, self.model, self.temperature, prompt_hash(messages), *inputs)
+
+    def _tweak_cache_key(self, messages: list, problem: str, current_syntax: str, tweak: str,
+                         kind: str = "tweak") -> str:
+        return self._cache_key(
+            kind, messages, normalize_text(problem), current_syntax.strip(), normalize_text(tweak)
+        )
+
+    def tweak_stats(self) -> dict:
+        """Share of tweaks served by each path, for measuring how many model calls were avoided."""
+        total = sum(self.tweak_paths.values())
+        return {
+            "tweaks": total,
+            **{path: self.tweak_paths[path] for path in ("local", "patch", "full")},
+            "local_rate": self.tweak_paths["local"] / total if total else 0.0,
+        }
+
+    def usage_stats(self) -> dict:
+        """Token totals across model calls, and the share of prompt tokens served from the provider's cache."""
+        prompt_tokens = self.usage["prompt_tokens"]
+        return {
+            **{field: self.usage[field] for field in ("requests", "prompt_tokens", "cached_tokens", "completion_tokens")},
+            "cached_rate": self.usage["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        self.last_usage = usage_counts(usage)
+        self.usage["requests"] += 1
+        self.usage.update(self.last_usage)
+
+    def _record_tweak_path(self, path: str):
+        self.tweak_paths[path] += 1
+
+    def _quick_tweak(self, problem: str, current_syntax: str, tweak: str):
+        """Apply the tweak without regenerating the board: locally if it is purely cosmetic,
+        otherwise as model edit operations. Returns (syntax, path); (None, None) when the whole
+        board must be regenerated."""
+        operations = interpret_tweak(tweak, current_syntax)
+        if operations is not None and not self._ignored_moves(operations):
+            try:
+                syntax = apply_patch(current_syntax, operations)
+            except PatchError:
+                syntax = None
+            if syntax is not None:
+                self._record_tweak_path("local")
+                return syntax, "local"
+        if self.tweak_mode == "patch":
+            syntax = self._patch_tweak(problem, current_syntax, tweak)
+            if syntax is not None:
+                self._record_tweak_path("patch")
+                return syntax, "patch"
+        return None, None
+
+    def _ignored_moves(self, operations: list) -> bool:
+        """Whether operations set at on a flow board, where the renderer ignores it and nothing would move."""
+        return self.layout == "flow" and any(
+            operation.get("op") == "set" and str(operation.get("attr", "")).lower() == "at" for operation in operations
+        )
+
+    def _patch_tweak(self, problem: str, current_syntax: str, tweak: str):
+        """Apply the tweak through model-chosen edit operations; None if the patch does not apply."""
+        messages = tweak_messages(problem, current_syntax, tweak, task=PATCH_TASKS[self.layout], layout=self.layout)
+        key = self._tweak_cache_key(messages, problem, current_syntax, tweak, kind="patch")
+
+        def request():
+            operations = self._request_patch(messages)
+            if self._ignored_moves(operations):
+                raise PatchError("at has no effect on a flow board")
+            return apply_patch(current_syntax, operations)
+
+        try:
+            return self._cached(key, request)
+        except PatchError as e:
+            print(f"Patch could not be applied, regenerating the whole board: {e}")
+            return None
+
+    def _request_patch(self, messages: list) -> list:
+        response = self._race("patch", lambda timeout: self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice=EDIT_TOOL_CHOICE,
+            temperature=self.temperature,
+            timeout=timeout,
+        ))
+        self._record_usage(response.usage)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            raise PatchError("Model did not return edit operations")
+        try:
+            operations = json.loads(message.tool_calls[0].function.arguments).get("operations")
+        except (json.JSONDecodeError, AttributeError):
+            raise PatchError(f"Invalid edit operations: {message.tool_calls[0].function.arguments}")
+        if not isinstance(operations, list) or not operations:
+            raise PatchError("Edit operations were empty")
+        return operations
+
+    def _cached(self, key: str, generate) -> str:
+        if self.cache is None:
+            return generate()
+        syntax = self.cache.get(key)
+        if syntax is None:
+            syntax = generate()
+            self.cache.put(key, syntax)
+        return syntax
+
+    def _cached_stream(self, key: str, lines):
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            lines.close()  # Never started, so no request is made
+            yield from cached.split("\n")
+            return
+        collected = []
+        for line in lines:
+            collected.append(line)
+            yield line
+        # Only complete responses are stored; a cancelled stream never gets here
+        if self.cache is not None:
+            self.cache.put(key, "\n".join(collected))
+
+    def _race(self, kind: str, attempt, discard=None, deadline: float = None, streamed: bool = False):
+        """Run attempt(timeout) under the latency policy and return the first successful result.
+
+        Attempts run in background threads. A blocking HTTP request cannot be
+        interrupted from another thread, so a losing attempt is abandoned:
+        discard(result) releases whatever it returns once it finishes.
+        """
+        policy = self.latency
+        start = time.monotonic()
+        deadline = deadline or start + policy.deadline
+        hedge_after = policy.hedge_after(kind)
+        records = []
+        self.last_attempts = records
+        pending = {}
+        lock = threading.Lock()  # Orders a late finish against the attempt being abandoned
+
+        def launch(hedge):
+            launched = time.monotonic()
+            record = {"kind": kind, "hedge": hedge, "started": round(launched - start, 3),
+                      "seconds": None, "outcome": "pending"}
+
+            def finished(future):
+                with lock:
+                    record["seconds"] = round(time.monotonic() - launched, 3)
+                    abandoned = record["outcome"] == "abandoned"
+                    if not abandoned:
+                        record["outcome"] = "error" if future.exception() else "ok"
+                if abandoned and discard is not None and future.exception() is None:
+                    discard(future.result())  # Finished after another attempt already won
+
+            records.append(record)
+            future = _in_thread(attempt, policy.timeout(deadline - launched, streamed))
+            pending[future] = record
+            future.add_done_callback(finished)
+
+        launch(False)
+        winner = error = retry_at = None
+        while pending or retry_at is not None:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if retry_at is not None and now >= retry_at:
+                retry_at = None
+                launch(False)
+                continue
+            timeout = deadline - now
+            if retry_at is not None:
+                timeout = min(timeout, retry_at - now)
+            hedge_at = start + hedge_after if hedge_after is not None else None
+            can_launch = len(records) < policy.max_attempts and retry_at is None
+            if can_launch and hedge_at is not None:
+                timeout = min(timeout, max(hedge_at - now, 0))
+            if not pending:
+                time.sleep(timeout)  # Backing off before a retry
+                continue
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = pending.pop(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                elif winner is None:
+                    winner = (future.result(), record)
+                elif discard is not None:
+                    discard(future.result())
+            if winner is not None:
+                break
+            if done and can_launch and is_retryable(error):
+                delay = backoff_delay(len(records) - 1, error)
+                if time.monotonic() + delay < deadline:  # Otherwise the error is reported now
+                    retry_at = time.monotonic() + delay
+            elif not done and can_launch and hedge_at is not None and time.monotonic() >= hedge_at:
+                self.hedges["sent"] += 1
+                launch(True)
+
+        for future, record in pending.items():
+            with lock:
+                finished_ok = record["outcome"] == "ok"
+                record["outcome"] = "abandoned"
+            if finished_ok and discard is not None:
+                discard(future.result())
+        if winner is None:
+            if error is not None and not pending:
+                raise error
+            raise TimeoutError(f"No response from the model within {policy.deadline:g}s")
+        result, record = winner
+        policy.record(kind, time.monotonic() - start - record["started"])
+        if record["hedge"]:
+            self.hedges["won"] += 1
+        return result
+
+    def _complete(self, messages: list) -> str:
+        # Make the API call using the client
+        response = self._race("complete", lambda timeout: self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice=TOOL_CHOICE,
+            temperature=self.temperature,
+            timeout=timeout,
+        ))
+        self._record_usage(response.usage)
+
+        # Extract the assistant's message
+        return syntax_from_message(response.choices[0].message)
+
+    def _open_stream(self, messages: list, timeout: httpx.Timeout):
+        """Start a streamed completion and wait for its first chunk, the latency that hedging targets."""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice=TOOL_CHOICE,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True},  # Usage arrives in a final chunk without choices
+            timeout=timeout,
+        )
+        chunks = iter(stream)
+        try:
+            first = [next(chunks)]
+        except StopIteration:
+            first = []
+        except BaseException:
+            stream.close()
+            raise
+        return stream, first, chunks
+
+    def _stream(self, messages: list):
+        deadline = time.monotonic() + self.latency.deadline
+        stream, first, chunks = self._race(
+            "first_chunk",
+            lambda timeout: self._open_stream(messages, timeout),
+            discard=lambda opened: opened[0].close(),
+            deadline=deadline,
+            streamed=True,
+        )
+
+        decoder = SyntaxStreamDecoder()
+        content = []  # Plain-text fallback if the model answers without the function
+        emitted = False
+        try:
+            for chunk in itertools.chain(first, chunks):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Model response did not finish within {self.latency.deadline:g}s")
+                if getattr(chunk, "usage", None):
+                    self._record_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.tool_calls:
+                    fragment = delta.tool_calls[0].function.arguments or ""
+                    for line in decoder.feed(fragment):
+                        emitted = True
+                        yield line
+                elif delta.content:
+                    content.append(delta.content)
+        finally:
+            # Also runs when the consumer closes the generator early, dropping the connection
+            stream.close()
+        for line in decoder.close():
+            emitted = True
+            yield line
+
+        if not emitted:
+            if not content:
+                raise Exception("Function arguments did not contain 'whiteboard_syntax'")
+            yield from "".join(content).splitlines()
+
 # Example usage
 if __name__ == "__main__":
     generator = GPTWhiteboardGenerator(API_KEY)
@@ -0,0 +1,184 @@
+import re
+
+from syntax import COLORS, parse
+
+# Pixels a "move" without an explicit distance shifts an element
+MOVE_STEP = 40
+# Scale applied by "bigger"/"smaller", and by "much bigger"/"much smaller"
+SIZE_STEP = 1.25
+LARGE_SIZE_STEP = 1.5
+MIN_SIZE = 8
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+# Words that carry no meaning of their own in a cosmetic tweak
+FILLER = {
+    "make", "the", "a", "an", "to", "please", "it", "its", "them", "their", "this", "that", "these", "those",
+    "color", "colour", "colored", "coloured", "in", "into", "text", "font", "size", "bit", "little",
+    "slightly", "much", "more", "lot", "turn", "change", "set", "paint", "also", "is", "are", "be",
+    "by", "px", "pixel", "pixels", "of", "should", "can", "you", "could", "and", "then", "all", "way",
+    "move", "shift", "nudge", "push", "up", "down", "left", "right", "further", "some", "group",
+}
+
+
+def _color_aliases():
+    aliases = {}
+    for name in COLORS:
+        for spelling in (name, name.replace("grey", "gray")):
+            aliases[spelling] = name
+            if spelling.startswith("dark"):
+                aliases["dark " + spelling[4:]] = name
+    return aliases
+
+
+COLOR_ALIASES = _color_aliases()
+_COLOR = re.compile(r"\b(" + "|".join(sorted(map(re.escape, COLOR_ALIASES), key=len, reverse=True)) + r")\b")
+_GROW = re.compile(r"\b(bigger|larger|enlarge|increase|grow)\b")
+_SHRINK = re.compile(r"\b(smaller|tinier|shrink|decrease|reduce)\b")
+_ABSOLUTE_SIZE = re.compile(r"\bsize\s+(?:to\s+|of\s+)?(\d+)\b")
+_MOVE = re.compile(r"\b(?:move|shift|nudge|push)\b")
+_DIRECTION = re.compile(r"\b(up|down|left|right)\b(?:\s+by\s+(\d+)\s*(?:px|pixels?)?)?")
+_MOVE_TO = re.compile(r"\bto\s*\(\s*(-?\d+)\s*,\s*(-?\d+)\s*\)")
+_CLAUSE = re.compile(r"\s*(?:,(?![^()]*\))|;|\band\b|\bthen\b)\s*")
+
+
+def _elements(syntax):
+    """Parsed elements of the board; each carries its enclosing group id."""
+    elements, _ = parse(syntax)
+    return [element for element in elements if element.type != "end group"]
+
+
+def _starts_with(pattern):
+    regex = re.compile(r"^\s*(?:" + pattern + r")\b", re.IGNORECASE)
+    return lambda element: bool(regex.match(element.content))
+
+
+def _of_type(*types):
+    return lambda element: element.type in types
+
+
+# Target phrases, tried in order; each maps a regex match to a predicate over elements
+TARGETS = [
+    (re.compile(r"(?:\belement\s+|\bid\s*=?\s*|#)(\w+)\b"), lambda m: lambda e: e.id == m.group(1)),
+    (re.compile(r"\bstep\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\b"),
+     lambda m: _starts_with(r"step\s*" + str(NUMBER_WORDS.get(m.group(1), m.group(1))))),
+    (re.compile(r"\bsteps\b"), lambda m: _starts_with(r"step")),
+    (re.compile(r"\b(?:title|heading|problem|question)\b"), lambda m: _starts_with(r"problem|question")),
+    (re.compile(r"\b(?:final\s+)?(?:answer|solution|result)s?\b"), lambda m: _starts_with(r"(?:final\s+)?(?:answer|solution|result)")),
+    (re.compile(r"\bhints?\b"), lambda m: _starts_with(r"hint")),
+    (re.compile(r"\b(?:extra\s+)?practice(?:\s+problems?)?\b"), lambda m: _starts_with(r"(?:extra\s+)?practice")),
+    (re.compile(r"\b(?:graphs?|plots?)\b"), lambda m: _of_type("graph")),
+    (re.compile(r"\b(?:equations?|formulas?|math)\b"), lambda m: _of_type("math")),
+    (re.compile(r"\b(?:annotations?|notes?)\b"), lambda m: _of_type("annotation")),
+    (re.compile(r"\b(?:everything|whole\s+board|all\s+elements)\b"), lambda m: _of_type("text", "math", "annotation", "graph")),
+]
+
+
+def _resolve(clause, entries):
+    """Elements named in a clause, and the clause with the target phrase removed."""
+    for pattern, predicate in TARGETS:
+        match = pattern.search(clause)
+        if match is None:
+            continue
+        test = predicate(match)
+        selected = [entry for entry in entries if test(entry)]
+        # A title that is not labelled "Problem:" is the first element on the board
+        if not selected and pattern is TARGETS[3][0]:
+            selected = [entry for entry in entries if entry.type != "group"][:1]
+        # "the practice group" means the group holding the practice problem
+        if re.search(r"\bgroup\b", clause):
+            groups = {entry.group for entry in selected}
+            selected = [entry for entry in entries if entry.id in groups] or selected
+        return selected, clause[:match.start()] + " " + clause[match.end():]
+    return None, clause
+
+
+def _members(targets, entries):
+    """Expand group targets into the elements they contain."""
+    expanded = []
+    for target in targets:
+        if target.type == "group":
+            expanded.extend(entry for entry in entries if entry.group == target.id)
+        else:
+            expanded.append(target)
+    return expanded
+
+
+def _clause_operations(clause, targets, entries):
+    """Edit operations for one clause, the clause with the edit words removed, or None."""
+    operations = []
+
+    color = _COLOR.search(clause)
+    if color:
+        value = COLOR_ALIASES[color.group(1)]
+        for element in _members(targets, entries):
+            operations.append({"op": "set", "id": element.id, "attr": "color", "value": value})
+        clause = _COLOR.sub(" ", clause)
+
+    absolute = _ABSOLUTE_SIZE.search(clause)
+    grow, shrink = _GROW.search(clause), _SHRINK.search(clause)
+    if absolute or grow or shrink:
+        step = LARGE_SIZE_STEP if re.search(r"\b(?:much|lot)\b", clause) else SIZE_STEP
+        for element in _members(targets, entries):
+            size = element.size
+            if absolute:
+                size = int(absolute.group(1))
+            else:
+                size = round(size * step) if grow else round(size / step)
+            operations.append({"op": "set", "id": element.id, "attr": "size", "value": str(max(size, MIN_SIZE))})
+        clause = _GROW.sub(" ", _SHRINK.sub(" ", _ABSOLUTE_SIZE.sub(" ", clause)))
+
+    direction, move_to = _DIRECTION.search(clause), _MOVE_TO.search(clause)
+    if _MOVE.search(clause) and (direction or move_to):
+        moved = set()
+        for element in targets:
+            # Elements without their own position move with the group that places them
+            if element.at is None and element.group is not None:
+                element = next(entry for entry in entries if entry.id == element.group)
+            if element.at is None:
+                return None, clause
+            if element.id in moved:
+                continue
+            moved.add(element.id)
+            x, y = element.at
+            if move_to:
+                x, y = int(move_to.group(1)), int(move_to.group(2))
+            else:
+                distance = int(direction.group(2) or MOVE_STEP)
+                dx, dy = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}[direction.group(1)]
+                x, y = max(x + dx * distance, 0), max(y + dy * distance, 0)
+            operations.append({"op": "set", "id": element.id, "attr": "at", "value": f"({x},{y})"})
+        clause = _DIRECTION.sub(" ", _MOVE_TO.sub(" ", clause))
+
+    return (operations or None), clause
+
+
+def interpret_tweak(tweak, syntax):
+    """Edit operations for a purely cosmetic tweak, or None if the model is needed.
+
+    Recognizes color, size and position changes ("make step 3 blue", "bigger
+    title", "move the hints down") against elements picked by id, step number,
+    role (title, answer, hints, practice) or type. Anything the interpreter
+    does not fully understand returns None so the model handles it.
+    """
+    entries = _elements(syntax)
+    text = tweak.lower().strip().rstrip(".!")
+    operations = []
+    targets = None
+    for clause in filter(None, _CLAUSE.split(text)):
+        selected, rest = _resolve(clause, entries)
+        if selected is not None:
+            targets = selected
+        if not targets:
+            return None  # No target yet, or it names nothing on the board
+        clause_operations, rest = _clause_operations(rest, targets, entries)
+        if clause_operations is None:
+            return None
+        # Leftover words mean the tweak asks for more than a cosmetic edit
+        if any(word not in FILLER for word in re.findall(r"[a-z0-9]+", rest)):
+            return None
+        operations.extend(clause_operations)
+    return operations or None
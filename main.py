@@ -1,15 +1,100 @@
-from render import parse_syntax, render_whiteboard
+from syntax import Parser
+from scene import Scene
+from viewport import TiledCanvas
 from gpt import GPTWhiteboardGenerator
+from response_cache import ResponseCache
 import pygame
 from dotenv import load_dotenv
 import os
+import math
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Zoom goes in steps of ZOOM_STEP; level 0 is 1:1
+ZOOM_STEP = 1.25
+MIN_ZOOM_LEVEL = -3
+MAX_ZOOM_LEVEL = 5
+# Ctrl + these keys zoom in, out, or back to 1:1 (0)
+ZOOM_KEYS = {
+    pygame.K_EQUALS: 1, pygame.K_PLUS: 1, pygame.K_KP_PLUS: 1,
+    pygame.K_MINUS: -1, pygame.K_KP_MINUS: -1,
+    pygame.K_0: 0, pygame.K_KP0: 0,
+}
+
+# Posted by the background job whenever it queues a result, so an idle main loop wakes up for it
+RESULT_EVENT = pygame.USEREVENT + 1
+
+def report(results, *message):
+    results.put(message)
+    pygame.event.post(pygame.event.Event(RESULT_EVENT))
+
+def board_canvas(scene, elements, scale=1.0):
+    """Lay the elements out on the scene; the canvas paints them tile by tile as they scroll into view."""
+    layers, positions, height = scene.arrange(elements, scale)
+    return TiledCanvas(math.ceil(scene.width * scale), height, layers, positions, scale)
+
+def zoom_whiteboard(job_id, cancel, elements, scene, scale, results):
+    """Background job: re-rasterize the board at a new zoom so it is sharp again."""
+    if cancel.is_set():
+        return  # A later zoom superseded this one before it started
+    try:
+        report(results, "zoomed", job_id, board_canvas(scene, elements, scale))
+    except Exception as e:
+        report(results, "error", job_id, e)
+
+def stream_whiteboard(job_id, cancel, syntax_lines, previous_elements, scene, renderer, results, scale=1.0):
+    """Reader thread: pull the model's lines and queue a scene update on renderer for each element.
+
+    Only the scene updates run on renderer, the single worker that owns the
+    scene, so a model call that stalls holds just this thread and a newer
+    request starts at once. A snapshot with a newer one queued behind it is skipped.
+    """
+    latest = [0]  # Element count of the newest snapshot queued
+
+    def render(elements, count):
+        if cancel.is_set() or count < latest[0]:
+            return
+        try:
+            report(results, "progress", job_id, (board_canvas(scene, elements, scale), count))
+        except Exception as e:
+            report(results, "error", job_id, e)
+
+    def finish(syntax, elements):
+        if cancel.is_set():
+            return
+        try:
+            report(results, "done", job_id, (syntax, elements, board_canvas(scene, elements, scale)))
+        except Exception as e:
+            report(results, "error", job_id, e)
+
+    try:
+        lines = []
+        parser = Parser()
+        streamed = parser.elements
+        for line in syntax_lines:
+            if cancel.is_set():
+                syntax_lines.close()  # Stop reading the response
+                return
+            lines.append(line)
+            if parser.feed(line) is not None:
+                # Until a tweak finishes, the rest of the previous board stays in place
+                latest[0] = len(streamed)
+                renderer.submit(render, streamed + previous_elements[len(streamed):], len(streamed))
+        if cancel.is_set():
+            return
+        for diagnostic in parser.close()[1]:
+            print(f"Whiteboard Syntax {diagnostic}")
+        renderer.submit(finish, "\n".join(lines), streamed)
+    except Exception as e:
+        report(results, "error", job_id, e)
+
 def main():
     # Initialize the GPTWhiteboardGenerator with the API key
-    generator = GPTWhiteboardGenerator(API_KEY)
+    generator = GPTWhiteboardGenerator(API_KEY, cache=ResponseCache())
 
     # Initialize Pygame
     pygame.init()
@@ -25,6 +110,8 @@ def main():
     font = pygame.font.Font(None, 32)
 
     LEFT_MARGIN = 120  # Space for the input box
+    # Retained layers let tweaks redraw only what changed; text wraps to the visible width
+    scene = Scene(screen.get_width() - LEFT_MARGIN, mode=generator.layout)
     input_box = pygame.Rect(20, 60, 280, 32)
     color_inactive = pygame.Color('lightskyblue3')
     color_active = pygame.Color('dodgerblue2')
@@ -35,22 +122,80 @@ def main():
     loading = False
 
     scroll_offset = 0
+    scroll_x = 0  # Horizontal scroll, for boards zoomed wider than the window
     scroll_speed = 30  # Adjust as needed
     max_scroll = 0  # Initialize max_scroll
+    zoom_level = 0
+    zoom = 1.0
+
+    # The board being shown; None until the first one arrives
+    canvas = None
+
+    # Each request is read on its own thread and results come back through a queue. Scene updates
+    # run on one render worker, keeping the scene single-threaded; a superseded request stops at
+    # its next line without holding the worker while its model call is still blocked.
+    renderer = ThreadPoolExecutor(max_workers=1)
+    results = queue.Queue()
+    job_id = 0
+    cancel_event = threading.Event()
+    progress_text = ""
+    committed_canvas = None  # Last completed board, restored on cancel
+    zoom_cancel = threading.Event()
+    requested_zoom = None  # (board job, zoom) of the last re-rasterization submitted
 
-    # Placeholder for content surface and total content height
-    content_surface = None
-    total_content_height = 0
+    def submit(syntax_lines, previous_elements):
+        nonlocal job_id, cancel_event
+        cancel_event.set()  # Supersede any request still in flight
+        job_id += 1
+        cancel_event = threading.Event()
+        threading.Thread(
+            target=stream_whiteboard,
+            args=(job_id, cancel_event, syntax_lines, previous_elements, scene, renderer, results, zoom),
+            daemon=True,  # A stalled model call must not keep the app from exiting
+        ).start()
+
+    def submit_zoom():
+        nonlocal zoom_cancel, requested_zoom
+        zoom_cancel.set()  # Only the latest zoom of a gesture is worth rasterizing
+        zoom_cancel = threading.Event()
+        renderer.submit(zoom_whiteboard, job_id, zoom_cancel, elements, scene, zoom, results)
+        requested_zoom = (job_id, zoom)
+
+    def set_zoom(level):
+        nonlocal zoom_level, zoom, scroll_offset, scroll_x
+        zoom_level = max(MIN_ZOOM_LEVEL, min(MAX_ZOOM_LEVEL, level))
+        new_zoom = round(ZOOM_STEP ** zoom_level, 4)
+        # Keep the board point at the top left of the view in place
+        scroll_offset = round(scroll_offset * new_zoom / zoom)
+        scroll_x = round(scroll_x * new_zoom / zoom)
+        zoom = new_zoom
+
+    # Only regions whose content changed are redrawn; an idle loop sleeps in event.wait()
+    dirty = [screen.get_rect()]
+    board_rect = pygame.Rect(LEFT_MARGIN, 0, screen.get_width() - LEFT_MARGIN, screen.get_height())
+    status_position = (20, input_box.y + input_box.h + 10)
+    # Text that never changes is rendered once; the rest is re-rendered only when it changes
+    instruction_surfaces = {
+        text: font.render(text, True, (0, 0, 0)) for text in ("Enter problem description:", "Enter tweak:")
+    }
+    shown_instruction = shown_input = shown_status = shown_board = None
+    instruction_surface = txt_surface = status_surface = None
 
     while not done:
-        for event in pygame.event.get():
+        events = pygame.event.get() if dirty else [pygame.event.wait()] + pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 done = True
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                dirty.append(screen.get_rect())
+            elif event.type == pygame.MOUSEWHEEL and pygame.key.get_mods() & pygame.KMOD_CTRL:
+                set_zoom(zoom_level + event.y)
             elif event.type == pygame.MOUSEWHEEL:
                 scroll_offset += event.y * scroll_speed
-                # Limit scroll_offset to prevent scrolling too far
-                max_scroll = total_content_height - screen.get_height()
-                scroll_offset = max(-max_scroll, min(0, scroll_offset))
+                scroll_x -= event.x * scroll_speed  # Clamped below, with the vertical offset
+            elif event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL and event.key in ZOOM_KEYS:
+                step = ZOOM_KEYS[event.key]
+                set_zoom(zoom_level + step if step else 0)
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 # If the user clicked on the input_box rect
                 if input_box.collidepoint(event.pos):
@@ -63,92 +208,120 @@ def main():
                     if event.key == pygame.K_RETURN:
                         user_input = user_text.strip()
                         user_text = ""
-                        if not loading:
-                            if problem_description == "":
-                                # First input is the problem description
-                                problem_description = user_input
-                                try:
-                                    loading = True
-                                    # Update display to show loading
-                                    screen.fill((255, 255, 255))
-                                    instruction_text = font.render("Loading...", True, (0, 0, 0))
-                                    screen.blit(instruction_text, (20, 20))
-                                    pygame.display.flip()
-
-                                    # Generate whiteboard syntax using GPT
-                                    whiteboard_syntax = generator.generate_syntax(problem_description)
-                                    elements = parse_syntax(whiteboard_syntax)
-                                    loading = False
-
-                                    # Render content surface
-                                    content_surface, total_content_height = render_whiteboard(
-                                        elements, screen.get_width(), 5000  # Adjust height as needed
-                                    )
-                                except Exception as e:
-                                    print(f"Error: {e}")
-                                    loading = False
-                            else:
-                                # Subsequent inputs are tweaks
-                                tweak_description = user_input
-                                try:
-                                    loading = True
-                                    # Update display to show loading
-                                    screen.fill((255, 255, 255))
-                                    instruction_text = font.render("Loading...", True, (0, 0, 0))
-                                    screen.blit(instruction_text, (20, 20))
-                                    pygame.display.flip()
-
-                                    # Generate updated syntax using GPT
-                                    whiteboard_syntax = generator.generate_tweak(
-                                        problem_description, whiteboard_syntax, tweak_description
-                                    )
-                                    elements = parse_syntax(whiteboard_syntax)
-                                    loading = False
-
-                                    # Re-render content surface with updated elements
-                                    content_surface, total_content_height = render_whiteboard(
-                                        elements, screen.get_width(), 5000  # Adjust height as needed
-                                    )
-                                except Exception as e:
-                                    print(f"Error: {e}")
-                                    loading = False
+                        if problem_description == "" or whiteboard_syntax == "":
+                            # First input is the problem description (or replaces one still generating)
+                            problem_description = user_input
+                            submit(generator.stream_syntax(problem_description), [])
+                        else:
+                            # Subsequent inputs are tweaks; a new tweak replaces one still in flight
+                            tweak_description = user_input
+                            submit(
+                                generator.stream_tweak(problem_description, whiteboard_syntax, tweak_description),
+                                elements
+                            )
+                        loading = True
+                        progress_text = "Loading..."
+                    elif event.key == pygame.K_ESCAPE and loading:
+                        # Cancel the in-flight request and go back to the last completed board
+                        cancel_event.set()
+                        job_id += 1
+                        loading = False
+                        canvas = committed_canvas
+                        if whiteboard_syntax == "":
+                            problem_description = ""
                     elif event.key == pygame.K_BACKSPACE:
                         user_text = user_text[:-1]
                     else:
                         user_text += event.unicode
 
-        # Render the screen
-        screen.fill((255, 255, 255))  # White background
+        # Collect results from the background job, ignoring superseded ones
+        while True:
+            try:
+                kind, result_id, payload = results.get_nowait()
+            except queue.Empty:
+                break
+            if result_id != job_id:
+                continue
+            if kind == "progress":
+                canvas, element_count = payload
+                progress_text = f"Loading... ({element_count} elements)"
+            elif kind == "done":
+                whiteboard_syntax, elements, canvas = payload
+                committed_canvas = canvas
+                loading = False
+            elif kind == "zoomed":
+                if payload.scale == zoom and not loading:
+                    canvas = committed_canvas = payload
+            elif kind == "error":
+                print(f"Error: {payload}")
+                canvas = committed_canvas
+                if whiteboard_syntax == "":
+                    problem_description = ""
+                loading = False
 
-        # Blit the content surface onto the screen with scroll offset
-        if content_surface:
-            # Limit scroll_offset to prevent scrolling too far
-            max_scroll = max(0, total_content_height - screen.get_height())
-            scroll_offset = max(-max_scroll, min(0, scroll_offset))
+        # Limit scrolling to the board at the current zoom, e.g. after the board got shorter
+        ratio = zoom / canvas.scale if canvas else 1.0
+        max_scroll = max(0, round(canvas.height * ratio) - screen.get_height()) if canvas else 0
+        scroll_offset = max(-max_scroll, min(0, scroll_offset))
+        max_scroll_x = max(0, round(canvas.width * ratio) - board_rect.width) if canvas else 0
+        scroll_x = max(0, min(max_scroll_x, scroll_x))
 
-            # Blit the content surface onto the screen at the correct position
-            screen.blit(content_surface, (LEFT_MARGIN, scroll_offset))
+        # Re-rasterize at the new zoom in the background; until then the current raster is stretched
+        if canvas and not loading and canvas.scale != zoom and requested_zoom != (job_id, zoom):
+            submit_zoom()
 
-        # Render instructions and input box
+        # Invalidate the regions whose state changed since the last frame
         instruction = "Enter problem description:" if problem_description == "" else "Enter tweak:"
-        instruction_surface = font.render(instruction, True, (0, 0, 0))
-        screen.blit(instruction_surface, (20, 20))
-
-        # Render the input box
-        txt_surface = font.render(user_text, True, (0, 0, 0))
-        width = max(280, txt_surface.get_width() + 10)
-        input_box.w = width
-        screen.blit(txt_surface, (input_box.x + 5, input_box.y + 5))
-        pygame.draw.rect(screen, color, input_box, 2)
+        if instruction != shown_instruction:
+            if instruction_surface:
+                dirty.append(instruction_surface.get_rect(topleft=(20, 20)))
+            instruction_surface = instruction_surfaces[instruction]
+            dirty.append(instruction_surface.get_rect(topleft=(20, 20)))
+            shown_instruction = instruction
+        if (user_text, color) != shown_input:
+            dirty.append(input_box.copy())
+            txt_surface = font.render(user_text, True, (0, 0, 0))
+            input_box.w = max(280, txt_surface.get_width() + 10)
+            dirty.append(input_box.copy())
+            shown_input = (user_text, color)
+        status = progress_text + "  (Esc to cancel)" if loading else ""
+        if status != shown_status:
+            if status_surface:
+                dirty.append(status_surface.get_rect(topleft=status_position))
+            status_surface = font.render(status, True, (255, 0, 0)) if status else None
+            if status_surface:
+                dirty.append(status_surface.get_rect(topleft=status_position))
+            shown_status = status
+        if (canvas, scroll_offset, scroll_x, zoom) != shown_board:
+            dirty.append(board_rect)
+            shown_board = (canvas, scroll_offset, scroll_x, zoom)
+        if not dirty:
+            continue
 
-        # Display loading message if necessary
-        if loading:
-            loading_surface = font.render("Loading...", True, (255, 0, 0))
-            screen.blit(loading_surface, (20, input_box.y + input_box.h + 10))
+        # Redraw each dirty region, clipped to it, back to front
+        for rect in dirty:
+            screen.set_clip(rect)
+            screen.fill((255, 255, 255), rect)  # White background
+            if canvas and rect.colliderect(board_rect):
+                # Only the tiles under the window are painted and blitted
+                canvas.draw(screen, (LEFT_MARGIN, 0), -scroll_offset, screen.get_height(), scroll_x, zoom)
+            screen.blit(instruction_surface, (20, 20))
+            screen.blit(txt_surface, (input_box.x + 5, input_box.y + 5))
+            pygame.draw.rect(screen, color, input_box, 2)
+            if status_surface:
+                screen.blit(status_surface, status_position)
+        screen.set_clip(None)
 
-        pygame.display.flip()
-        clock.tick(30)
+        pygame.display.update(dirty)
+        dirty = []
+        clock.tick(60)  # Caps the frame rate while scrolling or streaming
 
+    cancel_event.set()
+    renderer.shutdown(wait=False, cancel_futures=True)
+    if generator.tweak_paths:
+        print(f"Tweak paths: {generator.tweak_stats()}")
+    if generator.usage:
+        print(f"Token usage: {generator.usage_stats()}")
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Board returned for every generate_whiteboard_syntax call
+SAMPLE_SYNTAX = """[text id=1] content="Problem: {problem}" at=(50,50) color=darkred size=36
+[math id=2] content="$f(x) = x^3$" at=(50,120) color=blue size=32
+[annotation id=3] content="Step 1: Apply the power rule" at=(50,200) color=darkgreen size=28
+[math id=4] content="$f'(x) = 3x^2$" at=(50,260) color=purple size=32
+[text id=5] content="Answer: $3x^2$" at=(50,340) color=green size=34"""
+
+# Edit operations returned for every edit_whiteboard call
+SAMPLE_OPERATIONS = [{"op": "set", "id": "5", "attr": "color", "value": "red"}]
+
+
+class MockSettings:
+    def __init__(self, delay=0.2, slow_rate=0.0, slow_delay=5.0, error_rate=0.0, retry_after="0.1",
+                 chunk_size=40, chunk_delay=0.01):
+        self.delay = delay  # Seconds before the response (or first chunk) starts
+        self.slow_rate = slow_rate  # Share of requests that stall for slow_delay extra seconds
+        self.slow_delay = slow_delay
+        self.error_rate = error_rate  # Share of requests answered with 429
+        self.retry_after = retry_after  # Retry-After header sent with a 429
+        self.chunk_size = chunk_size  # Characters of function arguments per streamed chunk
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions like the OpenAI API, with a configurable latency profile."""
+
+    protocol_version = "HTTP/1.1"
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        settings = self.settings
+        with settings.lock:
+            settings.requests += 1
+
+        if random.random() < settings.error_rate:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                            {"Retry-After": settings.retry_after})
+            return
+        delay = settings.delay + (settings.slow_delay if random.random() < settings.slow_rate else 0.0)
+        time.sleep(delay)
+
+        name = ((body.get("tool_choice") or {}).get("function") or {}).get("name", "generate_whiteboard_syntax")
+        if name == "edit_whiteboard":
+            arguments = json.dumps({"operations": SAMPLE_OPERATIONS})
+        else:
+            problem = next((m["content"] for m in reversed(body.get("messages", [])) if m["role"] == "user"), "")
+            problem = " ".join(problem.split())[:60].replace('"', "'")
+            arguments = json.dumps({"whiteboard_syntax": SAMPLE_SYNTAX.format(problem=problem)})
+        usage = {
+            "prompt_tokens": sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4,
+            "completion_tokens": len(arguments) // 4,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        try:
+            if body.get("stream"):
+                self._stream(body, name, arguments, usage)
+            else:
+                message = {"role": "assistant", "content": None, "tool_calls": [
+                    {"id": "call_mock", "type": "function", "function": {"name": name, "arguments": arguments}}
+                ]}
+                self._send_json(200, self._envelope(body, "chat.completion", [
+                    {"index": 0, "message": message, "finish_reason": "tool_calls"}
+                ], usage))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client hung up, e.g. a cancelled hedge
+
+    def _stream(self, body, name, arguments, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        settings = self.settings
+        for start in range(0, len(arguments), settings.chunk_size):
+            call = {"index": 0, "function": {"arguments": arguments[start:start + settings.chunk_size]}}
+            if start == 0:
+                call.update({"id": "call_mock", "type": "function"})
+                call["function"]["name"] = name
+            self._send_event(self._envelope(body, "chat.completion.chunk", [
+                {"index": 0, "delta": {"tool_calls": [call]}, "finish_reason": None}
+            ]))
+            time.sleep(settings.chunk_delay)
+        self._send_event(self._envelope(body, "chat.completion.chunk", [
+            {"index": 0, "delta": {}, "finish_reason": "tool_calls"}
+        ]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._send_event(self._envelope(body, "chat.completion.chunk", [], usage))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    @staticmethod
+    def _envelope(body, kind, choices, usage=None):
+        payload = {"id": "chatcmpl-mock", "object": kind, "created": int(time.time()),
+                   "model": body.get("model", "mock"), "choices": choices}
+        if usage is not None:
+            payload["usage"] = usage
+        return payload
+
+    def _send_event(self, payload):
+        self._write_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(port=0, **settings):
+    """Start the mock server in a background thread; returns it, with the bound port in server_address."""
+    handler = type("Handler", (MockHandler,), {"settings": MockSettings(**settings)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mock OpenAI-compatible server for testing timeouts and hedging. "
+                    "Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:PORT/v1."
+    )
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds before each response starts")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests that stall")
+    parser.add_argument("--slow-delay", type=float, default=5.0, help="Extra seconds a stalled request waits")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    args = parser.parse_args()
+    server = serve(args.port, delay=args.delay, slow_rate=args.slow_rate, slow_delay=args.slow_delay,
+                   error_rate=args.error_rate)
+    print(f"Mock OpenAI server on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
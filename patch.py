@@ -0,0 +1,88 @@
+import re
+
+# Edit operations the model may return instead of re-emitting the whole board
+OPERATIONS = ("set", "insert_after", "delete", "replace_content")
+
+_ID = re.compile(r'^\s*\[(?P<type>[\w ]+?)\s[^\]]*?\bid=(?P<id>"[^"]*"|[^\s\]]+)')
+# Same value forms as syntax.Parser; scanning left to right skips text inside quoted values
+_ATTRIBUTE = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\(.*?\)|[^\s\]]+)')
+
+
+class PatchError(Exception):
+    pass
+
+
+def element_id(line: str):
+    """The id attribute of a syntax line, or None."""
+    match = _ID.match(line)
+    return match.group("id").strip('"') if match else None
+
+
+def format_value(attribute: str, value) -> str:
+    """Render a value the way it is written in Whiteboard Syntax."""
+    if isinstance(value, (list, tuple)):
+        return "(" + ",".join(str(int(v)) for v in value) + ")"
+    value = str(value)
+    if attribute in ("content", "equation") or not re.fullmatch(r'[\w().,\-]+', value):
+        return '"' + value.replace('"', '\\"') + '"'
+    return value
+
+
+def _find(lines: list, target: str) -> int:
+    matches = [index for index, line in enumerate(lines) if element_id(line) == target]
+    if not matches:
+        raise PatchError(f"No element with id {target}")
+    if len(matches) > 1:
+        raise PatchError(f"Element id {target} is not unique")
+    return matches[0]
+
+
+def _group_end(lines: list, start: int) -> int:
+    """Index of the [end group] line closing the group opened at start."""
+    for index in range(start + 1, len(lines)):
+        if lines[index].strip().startswith("[end group"):
+            return index
+    raise PatchError("Group is not closed")
+
+
+def set_attribute(line: str, attribute: str, value) -> str:
+    """Replace an attribute on a syntax line, or add it if missing."""
+    if not re.fullmatch(r"[a-z_]+", attribute) or attribute in ("id", "type"):
+        raise PatchError(f"Cannot set attribute {attribute!r}")
+    token = f"{attribute}={format_value(attribute, value)}"
+    for match in _ATTRIBUTE.finditer(line):
+        if match.group(1).lower() == attribute:
+            return line[:match.start()] + token + line[match.end():]
+    if line.rstrip().endswith("]") and line.lstrip().startswith("[group"):
+        return line.rstrip()[:-1] + " " + token + "]"  # Group attributes live inside the brackets
+    return line.rstrip() + " " + token
+
+
+def apply_patch(syntax: str, operations: list) -> str:
+    """Apply edit operations keyed by element id; raises PatchError if any cannot be applied."""
+    lines = syntax.strip().split("\n")
+    for operation in operations:
+        kind = operation.get("op")
+        target = str(operation.get("id", ""))
+        if kind not in OPERATIONS:
+            raise PatchError(f"Unknown operation {kind!r}")
+        index = _find(lines, target)
+
+        if kind == "set":
+            lines[index] = set_attribute(lines[index], operation.get("attr", ""), operation.get("value", ""))
+        elif kind == "replace_content":
+            lines[index] = set_attribute(lines[index], "content", operation.get("content", ""))
+        elif kind == "delete":
+            end = _group_end(lines, index) if lines[index].lstrip().startswith("[group") else index
+            del lines[index:end + 1]
+        elif kind == "insert_after":
+            new_lines = [line for line in str(operation.get("line", "")).split("\n") if line.strip()]
+            if not new_lines or not all(line.strip().startswith("[") for line in new_lines):
+                raise PatchError("insert_after needs Whiteboard Syntax lines")
+            for line in new_lines:
+                new_id = element_id(line)
+                if new_id is not None and any(element_id(existing) == new_id for existing in lines):
+                    raise PatchError(f"Element id {new_id} already exists")
+            lines[index + 1:index + 1] = new_lines
+
+    return "\n".join(lines)
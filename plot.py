@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+import pygame
+
+from fonts import get_font, render_line
+
+GRID_COLOR = (176, 176, 176)
+AXIS_COLOR = (0, 0, 0)
+LABEL_COLOR = (0, 0, 0)
+LABEL_SIZE = 18
+TICK_LENGTH = 4
+PAD = 4
+
+
+def nice_ticks(lo, hi, target=5):
+    """Round tick positions (1, 2, 5 x 10^n steps) covering [lo, hi]."""
+    if not hi > lo:
+        return np.array([lo])
+    raw_step = (hi - lo) / target
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw_step)
+    start = math.ceil(lo / step) * step
+    ticks = np.arange(start, hi + step * 1e-9, step)
+    ticks[np.abs(ticks) < step * 1e-9] = 0.0  # Avoid "-0" labels
+    return ticks
+
+
+def format_tick(value):
+    return f"{value:g}".replace("-", "−")
+
+
+def y_limits(segments):
+    """Data range of the curve, padded like matplotlib's default margins."""
+    values = [y for _, y in segments if y.size]
+    if not values:
+        return -1.0, 1.0
+    lo = min(float(y.min()) for y in values)
+    hi = max(float(y.max()) for y in values)
+    if hi - lo < 1e-12:
+        lo, hi = lo - 1, hi + 1
+    margin = (hi - lo) * 0.05
+    return lo - margin, hi + margin
+
+
+def plot_surface(segments, domain, size, color, ylim=None):
+    """Draw axes, gridlines, tick labels and the curve segments onto a new size x size surface."""
+    surface = pygame.Surface((size, size), pygame.SRCALPHA)
+    font = get_font(LABEL_SIZE)
+
+    x_lo, x_hi = float(domain[0]), float(domain[1])
+    x_margin = (x_hi - x_lo) * 0.05
+    x_lo, x_hi = x_lo - x_margin, x_hi + x_margin
+    y_lo, y_hi = ylim or y_limits(segments)
+
+    x_ticks = nice_ticks(x_lo, x_hi)
+    y_ticks = nice_ticks(y_lo, y_hi)
+    y_labels = [render_line(format_tick(v), LABEL_SIZE, LABEL_COLOR) for v in y_ticks]
+    x_labels = [render_line(format_tick(v), LABEL_SIZE, LABEL_COLOR) for v in x_ticks]
+
+    # Plot area inside room for the tick labels
+    left = PAD + max(label.get_width() for label in y_labels) + TICK_LENGTH + 2
+    bottom = size - (PAD + font.get_height() + TICK_LENGTH + 2)
+    right = size - PAD - x_labels[-1].get_width() // 2
+    top = PAD + font.get_height() // 2
+    if right - left < 10 or bottom - top < 10:
+        left, top, right, bottom = 0, 0, size - 1, size - 1  # Too small for labels
+
+    def to_px(xs, ys):
+        px = left + (np.asarray(xs) - x_lo) * ((right - left) / (x_hi - x_lo))
+        py = bottom - (np.asarray(ys) - y_lo) * ((bottom - top) / (y_hi - y_lo))
+        return px, py
+
+    tick_px, _ = to_px(x_ticks, np.zeros_like(x_ticks))
+    _, tick_py = to_px(np.zeros_like(y_ticks), y_ticks)
+
+    for px, label in zip(tick_px, x_labels):
+        pygame.draw.line(surface, GRID_COLOR, (px, top), (px, bottom))
+        pygame.draw.line(surface, AXIS_COLOR, (px, bottom), (px, bottom + TICK_LENGTH))
+        if left > 0:
+            surface.blit(label, (px - label.get_width() / 2, bottom + TICK_LENGTH + 2))
+    for py, label in zip(tick_py, y_labels):
+        pygame.draw.line(surface, GRID_COLOR, (left, py), (right, py))
+        pygame.draw.line(surface, AXIS_COLOR, (left - TICK_LENGTH, py), (left, py))
+        if left > 0:
+            surface.blit(label, (left - TICK_LENGTH - 2 - label.get_width(), py - label.get_height() / 2))
+    pygame.draw.rect(surface, AXIS_COLOR, pygame.Rect(left, top, right - left + 1, bottom - top + 1), 1)
+
+    # Clip the curve to the plot area so steep segments do not spill over the labels
+    surface.set_clip(pygame.Rect(left, top, right - left + 1, bottom - top + 1))
+    for xs, ys in segments:
+        px, py = to_px(xs, ys)
+        # Keep far out-of-range points within drawable integer limits
+        py = np.clip(py, top - size, bottom + size)
+        points = np.column_stack((px, py)).tolist()
+        if len(points) > 1:
+            pygame.draw.aalines(surface, color, False, points)
+        elif points:
+            surface.set_at((int(points[0][0]), int(points[0][1])), color)
+    surface.set_clip(None)
+
+    return surface
@@ -1,148 +1,396 @@
+import os
 import pygame
-import re
-import matplotlib.pyplot as plt
-from io import BytesIO
+import threading
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.transforms import IdentityTransform
 import numpy as np
+from render_cache import RenderCache
+from tex_engine import get_engine
+import render_pool
+from expr import ExpressionError, compile_expression
+import plot
+from sampling import DEFAULT_DOMAIN, plot_domain, sample_curve
+from syntax import COLORS, parse  # COLORS lived here before the parser moved; still importable from render
+from fonts import get_font, render_line, text_cache
 
-# Colors
-COLORS = {
-    "red": (255, 0, 0),
-    "green": (0, 255, 0),
-    "blue": (0, 0, 255),
-    "black": (0, 0, 0),
-    "white": (255, 255, 255),
-    "grey": (128, 128, 128),
-    "darkred": (139, 0, 0),
-    "darkgreen": (0, 100, 0),
-    "purple": (128, 0, 128),
-    "orange": (255, 165, 0),
-    "darkblue": (0, 0, 139),
-    "darkgrey": (105, 105, 105),
-}
+
+# Resolution used for LaTeX rasterization
+LATEX_DPI = 100
+
+# Rendered formulas keyed by (content, size, color, dpi), shared across boards and sessions
+latex_cache = RenderCache("latex")
 
 # Helper function for rendering LaTeX
-def render_latex(content, size, color, MAX_WIDTH):
-    """Render LaTeX content to a Pygame surface."""
-    plt.rc('text', usetex=True)
-    plt.rcParams['text.color'] = np.array(color) / 255  # Apply color
-    fig, ax = plt.subplots(figsize=(size / 20, size / 20), dpi=100)
-    ax.text(0.5, 0.5, content, fontsize=size, ha='center', va='center')
-    ax.axis('off')
-
-    # Save the plot to a BytesIO object
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0, transparent=True)
-    plt.close(fig)
-
-    # Convert to Pygame surface
-    buf.seek(0)
-    latex_image = pygame.image.load(buf, 'png')
-    buf.close()
-
-    return latex_image
+def render_latex(content, size, color, MAX_WIDTH, dpi=LATEX_DPI):
+    """Render LaTeX content to a Pygame surface, reusing cached renders."""
+    return render_latex_batch([(content, size, color)], dpi)[0]
+
+def render_latex_batch(formulas, dpi=LATEX_DPI, pool=None):
+    """Render [(content, size, color), ...], typesetting every cache miss in one TeX job."""
+    engine = get_engine()
+    backend = "tex" if engine else "mathtext"
+
+    surfaces = []
+    pending = {}  # cache key -> formula; identical formulas are typeset once
+    for content, size, color in formulas:
+        key = latex_cache.key(content, size, tuple(color), dpi, backend)
+        surface = latex_cache.get(key)
+        if surface is None:
+            pending.setdefault(key, (content, size, tuple(color)))
+        surfaces.append((key, surface))
+
+    rendered = {}
+    if engine:
+        keys = [key for key, formula in pending.items() if formula[0].strip()]
+        for key, surface in zip(keys, engine.render([pending[key] for key in keys], dpi)):
+            if surface is not None:
+                rendered[key] = surface
+    # No TeX on this host, or TeX rejected the formula
+    fallback = [key for key in pending if key not in rendered]
+    if pool and len(fallback) > 1:
+        futures = [render_pool.submit(pool, "_rasterize_mathtext", *pending[key], dpi) for key in fallback]
+        for key, future in zip(fallback, futures):
+            rendered[key] = render_pool.to_surface(future.result())
+    else:
+        for key in fallback:
+            rendered[key] = _rasterize_mathtext(*pending[key], dpi)
+    for key in pending:
+        latex_cache.put(key, rendered[key])
+
+    return [surface if surface is not None else rendered[key] for key, surface in surfaces]
+
+# Matplotlib figures reused between renders; Agg canvases are not thread-safe, so one set per thread
+_figures = threading.local()
+
+def _figure(kind, figsize, dpi):
+    """Return a cleared, reusable figure with an Agg canvas attached."""
+    cache = getattr(_figures, "cache", None)
+    if cache is None:
+        cache = _figures.cache = {}
+    fig = cache.get(kind)
+    if fig is None:
+        fig = cache[kind] = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+    else:
+        fig.clear()
+        fig.set_dpi(dpi)
+        fig.set_size_inches(figsize)
+    fig.patch.set_alpha(0)  # Transparent background
+    return fig
+
+def _figure_to_surface(fig):
+    """Draw a figure and wrap its RGBA buffer, cropped to the inked area, as a Pygame surface."""
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())
+    alpha = pixels[:, :, 3]
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if not rows.size:
+        return pygame.Surface((1, 1), pygame.SRCALPHA)
+
+    # The one copy: the canvas buffer is reused by the next render
+    cropped = np.ascontiguousarray(pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+    return pygame.image.frombuffer(cropped, (cropped.shape[1], cropped.shape[0]), "RGBA")
+
+def _rasterize_mathtext(content, size, color, dpi):
+    """Render a formula with matplotlib's built-in mathtext (no TeX required)."""
+    # mathtext only understands $...$ delimiters
+    for opening, closing in (("\\(", "\\)"), ("\\[", "\\]")):
+        content = content.replace(opening, "$").replace(closing, "$")
+    if not content.strip():
+        return pygame.Surface((1, 1), pygame.SRCALPHA)
+
+    fig = _figure("text", (1, 1), dpi)
+    # Position in canvas pixels so the figure can be sized to the measured text
+    text = fig.text(0, 0, content, fontsize=size, color=np.array(color) / 255,
+                    usetex=False, transform=IdentityTransform())
+    renderer = fig.canvas.get_renderer()
+    try:
+        bbox = text.get_window_extent(renderer)
+    except ValueError:
+        # Unsupported LaTeX for mathtext; show the source rather than failing the board
+        text.set_parse_math(False)
+        bbox = text.get_window_extent(renderer)
+
+    pad = 2
+    fig.set_size_inches((bbox.width + 2 * pad) / dpi, (bbox.height + 2 * pad) / dpi)
+    text.set_position((pad - bbox.x0, pad - bbox.y0))
+    return _figure_to_surface(fig)
+
+# Graph renderer: "native" draws directly with Pygame, "matplotlib" is the slower high-fidelity mode
+GRAPH_BACKEND = os.getenv("WHITEBOARD_GRAPH_BACKEND", "native")
 
 # Function to render graphs
 def render_graph(content, domain, size, color, surface, position):
     """Render a graph to the Pygame surface."""
-    x = np.linspace(domain[0], domain[1], 1000)
-    y = eval(content)
+    surface.blit(rasterize_graph(content, domain, size, color), position)
+
+def rasterize_graph(content, domain, size, color, backend=None):
+    """Plot a graph into its own Pygame surface.
 
-    plt.figure(figsize=(size / 100, size / 100))
-    plt.plot(x, y, color=np.array(color) / 255)
-    plt.grid(True)
+    An equation that cannot be compiled or evaluated gives empty axes
+    labelled with its source, rather than failing the board.
+    """
+    domain = plot_domain(domain)
+    try:
+        segments, ylim = sample_curve(compile_expression(str(content)), domain, size)
+        invalid = False
+    except ExpressionError:
+        segments, ylim, invalid = [], None, True
 
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0, transparent=True)
-    plt.close()
+    if (backend or GRAPH_BACKEND) == "native":
+        surface = plot.plot_surface(segments, domain, size, color, ylim=ylim)
+    else:
+        surface = _matplotlib_graph(segments, ylim, size, color)
+    if invalid:
+        label = render_line(str(content), plot.LABEL_SIZE, color)
+        surface.blit(label, label.get_rect(center=surface.get_rect().center))
+    return surface
 
-    buf.seek(0)
-    graph_image = pygame.image.load(buf, 'png')
-    buf.close()
+def _matplotlib_graph(segments, ylim, size, color):
+    """Plot sampled segments with matplotlib, the slower high-fidelity backend."""
+    fig = _figure("graph", (size / 100, size / 100), 100)
+    fig.set_layout_engine("tight")  # Keep tick labels inside the canvas; padding is cropped later
+    ax = fig.add_subplot()
+    ax.patch.set_alpha(0)
+    for x, y in segments:
+        ax.plot(x, y, color=np.array(color) / 255)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    ax.grid(True)
 
-    surface.blit(graph_image, position)
+    return _figure_to_surface(fig)
 
-# Parse Syntax
-def parse_syntax(syntax):
-    elements = []
-    for line in syntax.strip().split("\n"):
-        if line.startswith("#") or not line.strip():
-            continue
-        if line.startswith("[group"):
-            group_attributes = {"type": "group"}
-            matches = re.findall(r'(\w+)=(".*?"|\(.*?\)|\S+)', line)
-            for key, value in matches:
-                if key == "at":
-                    value = tuple(map(int, value.strip("()").split(",")))
-                group_attributes[key] = value
-            elements.append(group_attributes)
-            continue
-        if line.startswith("[end group"):
-            elements.append({"type": "end group"})
+# Board margins: elements without a position start at LEFT_MARGIN, text wraps before RIGHT_MARGIN
+LEFT_MARGIN = 50
+RIGHT_MARGIN = 50
+TOP_MARGIN = 20
+BOTTOM_MARGIN = 20
+# Vertical gap between elements placed one after another, and the extra gap around a flowed group
+SPACING = 10
+GROUP_SPACING = 20
+# In flow mode the gap below an element grows with its font size, like the old "size * 1.5" line pitch
+FLOW_GAP = 0.5
+# "absolute" honours at=(x, y), "flow" stacks elements in order and ignores it,
+# "auto" flows boards that give no positions at all
+LAYOUT_MODES = ("auto", "absolute", "flow")
+# Narrowest column text is wrapped to, however far right it starts
+MIN_WRAP_WIDTH = 100
+# Element types drawn as wrapped plain text
+TEXT_TYPES = ("text", "annotation")
+# Element types whose size is a font size; a graph's size is its plot size in pixels
+FONT_TYPES = TEXT_TYPES + ("math",)
+
+# Break text into lines that fit a width
+def wrap_text(font, text, max_width):
+    """Split text at spaces into lines no wider than max_width; a word longer than a line is split too."""
+    lines = []
+    line = ""
+    for word in text.split(" "):
+        candidate = f"{line} {word}" if line else word
+        if font.size(candidate)[0] <= max_width:
+            line = candidate
             continue
+        if line:
+            lines.append(line)
+        while font.size(word)[0] > max_width and len(word) > 1:
+            # Longest prefix that fits, at least one character
+            end = len(word) - 1
+            while end > 1 and font.size(word[:end])[0] > max_width:
+                end -= 1
+            lines.append(word[:end])
+            word = word[end:]
+        line = word
+    lines.append(line)
+    return lines
 
-        # Parse element type
-        element_type_end = line.find(" ")
-        element_type = line[1:element_type_end]
-        attributes = {}
-
-        # Parse attributes using regex
-        attributes_string = line[element_type_end + 1:]
-        matches = re.findall(r'(\w+)=(".*?"|\(.*?\)|\S+)', attributes_string)
-        for key, value in matches:
-            key = key.strip().lower()
-            if value.startswith('"') and value.endswith('"'):
-                value = value.strip('"')  # Handle quoted strings
-            elif value.startswith("(") and value.endswith(")"):
-                value = tuple(map(int, value.strip("()").split(",")))  # Handle tuples
-            elif value.isdigit():
-                value = int(value)  # Handle integers
-            attributes[key] = value
-
-        attributes["type"] = element_type
-        elements.append(attributes)
-    return elements
+# Helper function for rendering wrapped text
+def render_text(content, size, color, max_width=None, antialias=True):
+    """Render text to a Pygame surface, wrapped to max_width when given; repeated text comes from fonts.text_cache."""
+    if not max_width:
+        return render_line(content, size, color, antialias)
+    key = ("wrapped", content, size, tuple(color), antialias, max_width)
+    surface = text_cache.get(key)
+    if surface is not None:
+        return surface
 
-# Function to render the whiteboard
-def render_whiteboard(elements, width, height):
-    """Render the whiteboard elements onto a Pygame surface."""
-    content_surface = pygame.Surface((width, height), pygame.SRCALPHA)
-    content_surface.fill((255, 255, 255, 0))  # Transparent background
+    font = get_font(size)
+    lines = wrap_text(font, content, max_width)
+    rendered = [render_line(line, size, color, antialias) for line in lines]
+    if len(rendered) == 1:
+        text_cache.put(key, rendered[0])
+        return rendered[0]
+    line_height = font.get_linesize()
+    surface = pygame.Surface(
+        (max(line.get_width() for line in rendered), line_height * (len(lines) - 1) + rendered[-1].get_height()),
+        pygame.SRCALPHA,
+    )
+    for index, line in enumerate(rendered):
+        surface.blit(line, (0, index * line_height))
+    text_cache.put(key, surface)
+    return surface
 
-    MAX_WIDTH = width - 40
-    y_position = 20  # Starting y position
+def layout_mode(elements, mode="auto"):
+    """Resolve "auto" to "flow" when no element has a position, else "absolute"."""
+    if mode not in LAYOUT_MODES:
+        raise ValueError(f"Unknown layout mode {mode!r}")
+    if mode == "auto":
+        return "absolute" if any(element.at for element in elements) else "flow"
+    return mode
 
+# Left edge of every element, following group origins
+def left_edges(elements, mode="auto"):
+    """x where each element starts: its own at, else the enclosing group's left edge, else LEFT_MARGIN."""
+    if layout_mode(elements, mode) == "flow":
+        return [LEFT_MARGIN] * len(elements)
+    edges = []
+    stack = [LEFT_MARGIN]
     for element in elements:
-        size = int(element.get("size", 20))
-        content = element.get("content", "")
-        color = COLORS.get(element.get("color", "black"), (0, 0, 0))
-        at = element.get("at", (50, y_position))
-        element_type = element.get("type")
-
-        if element_type == "text":
-            font = pygame.font.Font(None, size)
-            text_surface = font.render(content, True, color)
-            content_surface.blit(text_surface, at)
-            y_position += size * 1.5
+        if element.type == "end group":
+            if len(stack) > 1:
+                stack.pop()
+            edges.append(stack[-1])
+            continue
+        x = element.at[0] if element.at else stack[-1]
+        edges.append(x)
+        if element.type == "group":
+            stack.append(x)
+    return edges
+
+def wrap_widths(elements, width, mode="auto"):
+    """Width each text element may wrap to on a board this wide; None for elements that do not wrap."""
+    return [
+        max(MIN_WRAP_WIDTH, width - x - RIGHT_MARGIN) if element.type in TEXT_TYPES else None
+        for element, x in zip(elements, left_edges(elements, mode))
+    ]
+
+# Rasterize elements into standalone layers
+def rasterize_elements(elements, workers=None, widths=None):
+    """Rasterize each element into its own surface; None for elements that draw nothing.
+
+    widths holds the wrap width of each element (see wrap_widths); without
+    it text is drawn on a single line. With more than one worker (see
+    render_pool.RENDER_WORKERS), graphs and fallback formulas are rasterized
+    in parallel processes; results are returned in element order, so the
+    output matches a serial render.
+    """
+    pool = render_pool.get_pool(workers)
+    widths = widths or [None] * len(elements)
+
+    # Start graphs first so they rasterize while the formulas are typeset
+    graph_futures = {}
+    if pool and GRAPH_BACKEND == "matplotlib":  # Native graphs are cheaper than the IPC
+        for element in elements:
+            if element.type == "graph":
+                graph_futures[id(element)] = render_pool.submit(
+                    pool, "rasterize_graph",
+                    element.attrs.get("equation", "x**2"), element.attrs.get("domain", DEFAULT_DOMAIN),
+                    element.size, element.color,
+                )
+
+    # Typeset every formula on the board in a single batch up front
+    math_elements = [element for element in elements if element.type == "math"]
+    latex_surfaces = dict(zip(
+        map(id, math_elements),
+        render_latex_batch([
+            (element.content, element.size, element.color) for element in math_elements
+        ], pool=pool),
+    ))
+
+    layers = []
+    for element, max_width in zip(elements, widths):
+        size = element.size
+        content = element.content
+        color = element.color
+        element_type = element.type
+        layer = None
+
+        if element_type in TEXT_TYPES:
+            layer = render_text(content, size, color, max_width)
         elif element_type == "math":
-            latex_surface = render_latex(content, size, color, MAX_WIDTH)
-            content_surface.blit(latex_surface, at)
-            y_position += latex_surface.get_height() + 10
+            layer = latex_surfaces[id(element)]
         elif element_type == "graph":
-            equation = element.get("equation", "x**2")
-            domain = element.get("domain", (-10, 10))
-            render_graph(equation, domain, size, color, content_surface, at)
-            y_position += size + 10
+            equation = element.attrs.get("equation", "x**2")
+            domain = element.attrs.get("domain", DEFAULT_DOMAIN)
+            if id(element) in graph_futures:
+                layer = render_pool.to_surface(graph_futures[id(element)].result())
+            else:
+                layer = rasterize_graph(equation, domain, size, color)
         elif element_type == "table":
-            headers = element.get("headers", [])
-            rows = element.get("rows", [])
+            headers = element.attrs.get("headers", [])
+            rows = element.attrs.get("rows", [])
             # Render the table (to be implemented)
             pass
         elif element_type == "shape":
             # Render shapes like circles, rectangles, etc. (to be implemented)
             pass
+        layers.append(layer)
+
+    return layers
+
+# Layout pass: place every layer before any board pixels are allocated
+def layout(elements, layers, mode="auto"):
+    """Position of each element's layer and the board height needed to hold them all.
+
+    In "absolute" mode elements with an at are placed there and the others
+    flow down from the element before them, SPACING apart; a group's at is
+    the origin its unpositioned members flow from. In "flow" mode every at
+    is ignored: elements stack in order from their measured heights with a
+    gap scaled to their font size (SPACING below graphs), and each group is
+    a block set off by GROUP_SPACING. Either way the board continues below
+    a group's lowest member once the group ends.
+    """
+    flow = layout_mode(elements, mode) == "flow"
+    positions = []
+    frames = [[LEFT_MARGIN, TOP_MARGIN]]  # [x, next y] for the board and each open group
+    bottom = 0
+    for element, layer in zip(elements, layers):
+        frame = frames[-1]
+        if element.type == "end group":
+            if len(frames) > 1:
+                frames.pop()
+                frames[-1][1] = max(frames[-1][1], frame[1] + (GROUP_SPACING if flow else 0))
+            positions.append(None)
+            continue
+
+        if flow:
+            x, y = frame[0], frame[1] + (GROUP_SPACING if element.type == "group" else 0)
+        else:
+            x, y = element.at or frame
+        positions.append((x, y))
+        if element.type == "group":
+            frames.append([x, y])
+            continue
+        if layer is None:
+            continue
+        gap = max(SPACING, round(element.size * FLOW_GAP)) if flow and element.type in FONT_TYPES else SPACING
+        frame[1] = y + layer.get_height() + gap
+        bottom = max(bottom, y + layer.get_height())
+
+    return positions, int(bottom) + BOTTOM_MARGIN
 
+# Paint pass: draw the placed layers onto a canvas of exactly the laid-out size
+def paint(layers, positions, width, height):
+    content_surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    content_surface.fill((255, 255, 255, 0))  # Transparent background
+    for layer, position in zip(layers, positions):
+        if layer is not None:
+            content_surface.blit(layer, position)
     return content_surface
 
+# Position rasterized layers on the board
+def composite(elements, layers, width, mode="auto"):
+    """Lay out and draw element layers; returns (surface, content height), the surface being that tall."""
+    positions, height = layout(elements, layers, mode)
+    return paint(layers, positions, width, height), height
+
+# Function to render the whiteboard
+def render_whiteboard(elements, width, *, workers=None, mode="auto"):
+    """Render the whiteboard elements onto a Pygame surface; returns (surface, content height)."""
+    layers = rasterize_elements(elements, workers, wrap_widths(elements, width, mode))
+    return composite(elements, layers, width, mode)
+
 # Test the renderer with advanced syntax
 if __name__ == "__main__":
     pygame.init()
@@ -155,9 +403,11 @@ if __name__ == "__main__":
     [graph id=3] equation="x**2" domain=(-10,10) at=(50,200) color=green size=300
     [text id=4] content="Answer: The graph is displayed above." at=(50,520) color=darkgreen size=28
     """
-    elements = parse_syntax(syntax)
+    elements, diagnostics = parse(syntax)
+    for diagnostic in diagnostics:
+        print(diagnostic)
 
-    content_surface = render_whiteboard(elements, 1600, 900)
+    content_surface, _ = render_whiteboard(elements, 1600)
     screen.blit(content_surface, (0, 0))
     pygame.display.flip()
 
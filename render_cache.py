@@ -0,0 +1,225 @@
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pygame
+
+# Bump when the rasterizers change so stale pixels on disk are never reused
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "WHITEBOARD_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "whiteboard-ai"),
+)
+
+# Disk budget per namespace; beyond it the least recently used files are deleted
+DISK_CACHE_BYTES = int(os.getenv("WHITEBOARD_DISK_CACHE_MB", "256")) * 1024 * 1024
+# Pruning frees down to this share of the budget, so it runs once per many saves
+PRUNE_TO = 0.8
+
+# On-disk record: magic, width, height, then raw RGBA rows
+_HEADER = struct.Struct("<4sII")
+_MAGIC = b"WBS1"
+
+
+def surface_nbytes(surface):
+    """Approximate memory held by a surface's pixel buffer."""
+    return surface.get_pitch() * surface.get_height()
+
+
+class SurfaceLRU:
+    """In-process LRU of Pygame surfaces bounded by a byte budget."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            surface = self._entries.get(key)
+            if surface is not None:
+                self._entries.move_to_end(key)
+            return surface
+
+    def put(self, key, surface):
+        nbytes = surface_nbytes(surface)
+        if nbytes > self.max_bytes:
+            return  # Never let one huge surface flush the whole cache
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= surface_nbytes(old)
+            self._entries[key] = surface
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= surface_nbytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskStore:
+    """Raw RGBA surfaces on disk, safe to share between processes.
+
+    Files are kept under max_bytes by deleting the least recently used
+    ones, by modification time; a load refreshes the time of the file it
+    reads. current_bytes and evictions count this process only:
+    current_bytes is the size found by the last listing plus this process's
+    saves since. Once it passes the budget, the directory is listed again
+    and pruned from that fresh listing. Files other processes saved in the
+    meantime are counted then, so with several writers the directory can
+    exceed the budget until one of them prunes.
+    """
+
+    def __init__(self, directory, max_bytes=DISK_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.current_bytes = None  # Bytes on disk as of the last listing plus later saves; listed on first save
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".rgba")
+
+    def _files(self):
+        """(mtime, size, path) of every stored surface."""
+        files = []
+        try:
+            subdirectories = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return files
+        for subdirectory in subdirectories:
+            try:
+                for entry in os.scandir(subdirectory):
+                    if entry.name.endswith(".rgba"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue  # Removed by another process meanwhile
+        return files
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Recently used files are pruned last
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, width, height = _HEADER.unpack_from(data)
+        pixels = data[_HEADER.size:]
+        if magic != _MAGIC or len(pixels) != width * height * 4:
+            return None  # Torn or foreign file, treat as a miss
+        return pygame.image.frombytes(pixels, (width, height), "RGBA")
+
+    def save(self, key, surface):
+        path = self._path(key)
+        header = _HEADER.pack(_MAGIC, *surface.get_size())
+        pixels = pygame.image.tobytes(surface, "RGBA")
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so concurrent readers never see partial data
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(pixels)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except OSError:
+            return  # The disk tier is best-effort; memory still holds the surface
+        finally:
+            if tmp_path is not None:  # A failed write or rename must not leave the temp file behind
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            if self.current_bytes is None:
+                self.current_bytes = sum(size for _, size, _ in self._files())
+            else:
+                self.current_bytes += len(header) + len(pixels)
+            if self.current_bytes > self.max_bytes:
+                self._prune()
+
+    def _prune(self):
+        """Delete the least recently used files until the store is down to PRUNE_TO of its budget."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * PRUNE_TO
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass  # Already pruned by another process
+            total -= size
+        self.current_bytes = total
+
+
+class RenderCache:
+    """Two-level cache of rendered surfaces: memory LRU backed by a disk store."""
+
+    def __init__(self, namespace, cache_dir=DEFAULT_CACHE_DIR, max_bytes=64 * 1024 * 1024,
+                 disk_bytes=DISK_CACHE_BYTES):
+        self.namespace = namespace
+        self.memory = SurfaceLRU(max_bytes)
+        self.disk = DiskStore(os.path.join(cache_dir, namespace), disk_bytes) if cache_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, *parts):
+        """Content address for the given render inputs."""
+        raw = repr((CACHE_VERSION, self.namespace) + parts).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def get(self, key):
+        surface = self.memory.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+        if self.disk is not None:
+            surface = self.disk.load(key)
+            if surface is not None:
+                self.disk_hits += 1
+                self.memory.put(key, surface)
+                return surface
+        self.misses += 1
+        return None
+
+    def put(self, key, surface):
+        self.memory.put(key, surface)
+        if self.disk is not None:
+            self.disk.save(key, surface)
+
+    def stats(self):
+        """Hit/miss/eviction counters for logging and dashboards."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "entries": len(self.memory),
+            "bytes": self.memory.current_bytes,
+            "disk_evictions": self.disk.evictions if self.disk else 0,
+            "disk_bytes": (self.disk.current_bytes or 0) if self.disk else 0,
+        }
@@ -0,0 +1,49 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+# Worker processes for parallel rasterization; 0 or 1 renders serially on the calling thread
+RENDER_WORKERS = int(os.getenv("WHITEBOARD_RENDER_WORKERS", "0"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers=None):
+    """Shared process pool with the given number of workers, or None for serial rendering."""
+    workers = RENDER_WORKERS if workers is None else workers
+    if workers <= 1:
+        return None
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def _rasterize(name, args):
+    """Worker entry point: run a render.py rasterizer and ship back raw RGBA."""
+    import render
+
+    surface = getattr(render, name)(*args)
+    return surface.get_size(), pygame.image.tobytes(surface, "RGBA")
+
+
+def submit(pool, name, *args):
+    """Queue a rasterizer call on the pool; returns a future of (size, rgba bytes)."""
+    return pool.submit(_rasterize, name, args)
+
+
+def to_surface(result):
+    """Wrap a worker result as a Pygame surface without re-encoding."""
+    size, pixels = result
+    return pygame.image.frombuffer(pixels, size, "RGBA")
+
+
+def shutdown():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+CACHE_DIR = os.getenv("WHITEBOARD_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "whiteboard-ai"))
+# An empty WHITEBOARD_CACHE_DIR keeps responses in memory only, as it keeps renders off disk
+DEFAULT_PATH = os.path.join(CACHE_DIR, "responses.sqlite3") if CACHE_DIR else ":memory:"
+
+# Eviction frees down to this share of the limits, so it runs once per many puts
+PRUNE_TO = 0.8
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of user text so trivially different submissions share an entry."""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split()).rstrip(".!?;, ")
+
+
+class ResponseCache:
+    """SQLite-backed cache of model responses with TTL and size-based LRU eviction.
+
+    Safe to share between threads and, through SQLite's locking, between
+    processes such as separate Streamlit servers on one host. Each instance
+    tracks the table size from its own puts and only scans the table when
+    that estimate passes a limit, so with several writers the table can
+    briefly exceed the limits by what the others added.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._entries, self._bytes = self._size()
+
+    def _size(self):
+        return self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    @staticmethod
+    def key(*parts) -> str:
+        raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._entries -= 1
+                    self._bytes -= len(row[0].encode("utf-8"))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            replaced = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, size),
+            )
+            if replaced is None:
+                self._entries += 1
+            self._bytes += size - (replaced[0] if replaced else 0)
+            if self._entries > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones down to PRUNE_TO of the limits."""
+        expired = self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        self.evictions += max(expired, 0)
+        removed = self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM (SELECT key,"
+            "  ROW_NUMBER() OVER newest AS kept_entries, SUM(size) OVER newest AS kept_bytes"
+            "  FROM responses WINDOW newest AS (ORDER BY accessed DESC, key))"
+            " WHERE kept_entries > ? OR kept_bytes > ?)",
+            (int(self.max_entries * PRUNE_TO), int(self.max_bytes * PRUNE_TO)),
+        ).rowcount
+        self.evictions += max(removed, 0)
+        # Exact again, including whatever other processes wrote
+        self._entries, self._bytes = self._size()
+
+    def stats(self) -> dict:
+        """Hit-rate metrics for logging and dashboards."""
+        with self._lock:
+            entries, total = self._size()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._entries, self._bytes = 0, 0
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,118 @@
+import numpy as np
+
+# Target deviation, in pixels, between the drawn polyline and the true curve
+TOLERANCE_PX = 0.5
+# Intervals narrower than this are never split further
+MIN_INTERVAL_PX = 0.25
+# Upper bound on samples per pixel of plot width
+POINTS_PER_PIXEL = 4
+# x range plotted when a graph gives no usable domain
+DEFAULT_DOMAIN = (-10.0, 10.0)
+
+
+def split_finite(x, y):
+    """Split a sampled curve into runs of finite points."""
+    finite = np.isfinite(y)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], finite.view(np.int8), [0]))))
+    return [(x[start:stop], y[start:stop]) for start, stop in zip(edges[::2], edges[1::2])]
+
+
+def plot_domain(domain):
+    """domain as an increasing (lo, hi) pair of floats.
+
+    A reversed range is flipped and an empty one such as (0, 0) is widened
+    by 1 on each side, as y ranges are; anything that is not two finite
+    numbers gives DEFAULT_DOMAIN.
+    """
+    try:
+        lo, hi = (float(value) for value in domain)
+    except (TypeError, ValueError):
+        return DEFAULT_DOMAIN
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return DEFAULT_DOMAIN
+    if hi < lo:
+        lo, hi = hi, lo
+    if hi - lo < 1e-12:
+        lo, hi = lo - 1, hi + 1
+    return lo, hi
+
+
+def _robust_limits(ys):
+    """Y range of the uniformly spaced samples, ignoring asymptote spikes."""
+    ys = ys[np.isfinite(ys)]
+    if not ys.size:
+        return -1.0, 1.0
+    lo, hi = float(ys.min()), float(ys.max())
+    q_lo, q_hi = (float(q) for q in np.percentile(ys, [2, 98]))
+    span = max(q_hi - q_lo, 1e-12)
+    # Extremes far outside the bulk of the curve are poles; clip the view to the bulk
+    if lo < q_lo - 1.5 * span:
+        lo = q_lo - 0.25 * span
+    if hi > q_hi + 1.5 * span:
+        hi = q_hi + 0.25 * span
+    if hi - lo < 1e-12:
+        lo, hi = lo - 1, hi + 1
+    margin = (hi - lo) * 0.05
+    return lo - margin, hi + margin
+
+
+def sample_curve(f, domain, width_px, height_px=None, max_points=None):
+    """Adaptively sample y = f(x) for a plot width_px wide.
+
+    Starts from a grid derived from the pixel width, then repeatedly bisects
+    only the intervals whose midpoint strays more than TOLERANCE_PX from the
+    chord, or that border a NaN/inf. Returns (segments, ylim) where segments
+    is a list of (x, y) arrays split at non-finite values and detected
+    discontinuities, and ylim is a view range that ignores poles.
+    """
+    height_px = height_px or width_px
+    max_points = max_points or POINTS_PER_PIXEL * width_px
+    x_lo, x_hi = plot_domain(domain)
+    x_scale = width_px / (x_hi - x_lo)
+
+    xs = np.linspace(x_lo, x_hi, max(9, width_px // 8))
+    ys = np.asarray(f(xs), dtype=float)
+    ylim = _robust_limits(ys)
+    y_scale = height_px / (ylim[1] - ylim[0])
+
+    candidates = np.arange(xs.size - 1)
+    while candidates.size and xs.size < max_points:
+        room = max_points - xs.size
+
+        xa, xb = xs[candidates], xs[candidates + 1]
+        ya, yb = ys[candidates], ys[candidates + 1]
+        xm = (xa + xb) / 2
+        ym = np.asarray(f(xm), dtype=float)
+
+        finite = np.isfinite(ya) & np.isfinite(yb) & np.isfinite(ym)
+        any_finite = np.isfinite(ya) | np.isfinite(yb) | np.isfinite(ym)
+        with np.errstate(invalid="ignore"):
+            error = np.abs(ym - (ya + yb) / 2) * y_scale
+        error = np.where(finite, error, np.where(any_finite, np.inf, 0.0))
+
+        # Midpoints are inserted in one go; interval k now spans two intervals
+        xs = np.insert(xs, candidates + 1, xm)
+        ys = np.insert(ys, candidates + 1, ym)
+        left = candidates + np.arange(candidates.size)
+
+        refine = (error > TOLERANCE_PX) & ((xm - xa) * x_scale > MIN_INTERVAL_PX)
+        order = np.argsort(-error[refine], kind="stable")
+        worst_first = left[refine][order]
+        halves = np.column_stack((worst_first, worst_first + 1)).ravel()
+        candidates = np.sort(halves[:max(room - candidates.size, 0)])
+
+    # Split at jumps: fully refined intervals that still leap across the plot, or chords
+    # that run from beyond one edge of the view to beyond the other
+    dx_px = np.diff(xs) * x_scale
+    dy_px = np.abs(np.diff(ys)) * y_scale
+    with np.errstate(invalid="ignore"):
+        leaps = (dx_px <= 2 * MIN_INTERVAL_PX) & (dy_px > height_px)
+        crosses = (
+            ((ys[:-1] > ylim[1]) & (ys[1:] < ylim[0])) | ((ys[:-1] < ylim[0]) & (ys[1:] > ylim[1]))
+        ) & (dx_px < 2)
+    breaks = np.flatnonzero(leaps | crosses) + 1
+
+    segments = []
+    for x_part, y_part in zip(np.split(xs, breaks), np.split(ys, breaks)):
+        segments.extend(split_finite(x_part, y_part))
+    return segments, ylim
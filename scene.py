@@ -0,0 +1,125 @@
+import math
+from collections import OrderedDict
+
+from render import layout, paint, rasterize_elements, wrap_widths
+from syntax import Element
+
+# Zoomed rasters kept per element besides the 1:1 layer, most recently used first out last
+MIP_LEVELS = 3
+
+
+def element_keys(elements):
+    """Stable identity for each element: its id attribute, or its position when it has none."""
+    keys = []
+    seen = {}
+    for index, element in enumerate(elements):
+        element_id = element.id
+        if element_id is None:
+            keys.append(("#", index))
+            continue
+        # The model occasionally repeats an id; keep the occurrences apart
+        occurrence = seen.get(element_id, 0)
+        seen[element_id] = occurrence + 1
+        keys.append((element_id, occurrence))
+    return keys
+
+
+def attribute_hash(element, wrap_width=None):
+    # Position is applied at composite time, so moving an element keeps its layer unless it rewraps
+    return hash((element.render_key(), wrap_width))
+
+
+def scaled_element(element, scale):
+    """Copy of element drawn scale times larger: font sizes and graph sizes grow, position is left alone."""
+    return Element(
+        element.type, element.id, element.content, element.color, max(1, round(element.size * scale)),
+        element.at, element.attrs, element.line, element.group,
+    )
+
+
+class Scene:
+    """Retained-mode whiteboard that keeps one rasterized layer per element.
+
+    arrange() diffs a new element list against the previous one by id and
+    attribute hash, re-rasterizes only added or changed elements, and lays
+    the retained layers out; apply() also paints them onto one surface.
+    Zoomed rasters (arrange with scale != 1) are kept per element in a
+    small cache of resolution levels, so zooming back and forth reuses them.
+    """
+
+    def __init__(self, width, workers=None, mode="auto"):
+        self.width = width
+        self.workers = workers
+        self.mode = mode  # Layout mode, see render.LAYOUT_MODES
+        self.elements = []
+        self._layers = {}  # key -> (attribute hash, layer)
+        self._mips = {}  # key -> OrderedDict of scale -> (attribute hash, layer), at most MIP_LEVELS long
+        self.rasterized = 0  # Elements re-rasterized by the last update
+        self.reused = 0  # Elements whose layer was kept by the last update
+
+    def arrange(self, elements, scale=1.0):
+        """Update the scene to elements without painting; returns (layers, positions, content height).
+
+        With a scale other than 1, layers are rasterized that much larger and
+        positions and height are in scaled pixels. Layout always runs on the
+        1:1 layers, so every zoom level shows the same arrangement.
+        """
+        keys = element_keys(elements)
+        widths = wrap_widths(elements, self.width, self.mode)
+        hashes = [attribute_hash(element, wrap_width) for element, wrap_width in zip(elements, widths)]
+
+        changed = [
+            index for index, (key, digest) in enumerate(zip(keys, hashes))
+            if key not in self._layers or self._layers[key][0] != digest
+        ]
+        fresh = rasterize_elements(
+            [elements[index] for index in changed], self.workers, [widths[index] for index in changed]
+        )
+
+        layers = {key: self._layers[key] for key in keys if key in self._layers}
+        for index, layer in zip(changed, fresh):
+            layers[keys[index]] = (hashes[index], layer)
+        self._layers = layers  # Drops layers of removed elements
+        self.elements = list(elements)
+        self.rasterized = len(changed)
+        self.reused = len(elements) - len(changed)
+
+        ordered = [layers[key][1] for key in keys]
+        positions, height = layout(elements, ordered, self.mode)
+        if scale == 1:
+            self._mips = {key: levels for key, levels in self._mips.items() if key in layers}
+            return ordered, positions, height
+
+        positions = [position and (round(position[0] * scale), round(position[1] * scale)) for position in positions]
+        return self._scaled_layers(elements, keys, hashes, widths, scale), positions, math.ceil(height * scale)
+
+    def _scaled_layers(self, elements, keys, hashes, widths, scale):
+        mips = {key: self._mips.get(key, OrderedDict()) for key in keys}  # Drops removed elements
+        missing = [index for index, key in enumerate(keys) if mips[key].get(scale, (None,))[0] != hashes[index]]
+        fresh = rasterize_elements(
+            [scaled_element(elements[index], scale) for index in missing], self.workers,
+            [widths[index] and round(widths[index] * scale) for index in missing],
+        )
+        for index, layer in zip(missing, fresh):
+            mips[keys[index]][scale] = (hashes[index], layer)
+
+        scaled = []
+        for key in keys:
+            levels = mips[key]
+            levels.move_to_end(scale)
+            while len(levels) > MIP_LEVELS:
+                levels.popitem(last=False)
+            scaled.append(levels[scale][1])
+        self._mips = mips
+        self.rasterized += len(missing)
+        return scaled
+
+    def apply(self, elements):
+        """Update the scene to elements; returns (surface, content height)."""
+        layers, positions, height = self.arrange(elements)
+        return paint(layers, positions, self.width, height), height
+
+    def clear(self):
+        self.elements = []
+        self._layers = {}
+        self._mips = {}
@@ -1,13 +1,16 @@
 # streamlit_app.py
 
+import hashlib
 import os
 import streamlit as st
 import pygame
 import numpy as np
-from render import parse_syntax, render_whiteboard
+from syntax import Parser, parse
+from scene import Scene
 from gpt import GPTWhiteboardGenerator
+from response_cache import ResponseCache
+from export import BoardExporter
 from dotenv import load_dotenv
-from PIL import Image
 
 # Set the SDL_VIDEODRIVER environment variable to 'dummy' to prevent Pygame from opening a window
 os.environ["SDL_VIDEODRIVER"] = "dummy"
@@ -19,26 +22,105 @@ pygame.init()
 load_dotenv()
 API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize the GPTWhiteboardGenerator with the API key
-generator = GPTWhiteboardGenerator(API_KEY)
+# Rendered boards kept by st.cache_data, shared by all sessions
+RENDERED_BOARDS = 64
+# Encodings for the finished board and for frames drawn while a response streams in
+BOARD_FORMAT = os.getenv("WHITEBOARD_IMAGE_FORMAT", "png")
+PREVIEW_FORMAT = os.getenv("WHITEBOARD_PREVIEW_FORMAT", "jpeg")
+# Streamed frames kept for reuse; they are seldom shown twice, so they get their own small LRU
+PREVIEW_ENTRIES = 4
 
-def surface_to_image(surface):
-    """Converts a Pygame surface to a PIL image."""
-    data = pygame.image.tostring(surface, 'RGBA')
-    image = Image.frombytes('RGBA', surface.get_size(), data)
-    return image
+@st.cache_resource
+def get_generator():
+    """One GPTWhiteboardGenerator for every session and rerun."""
+    return GPTWhiteboardGenerator(API_KEY, cache=ResponseCache())
 
-# Initialize session state variables
+def get_renderer():
+    """This session's Scene; its retained layers follow one board, so sessions never share one."""
+    if "scene" not in st.session_state:
+        st.session_state.scene = Scene(1200, mode=generator.layout)
+    return st.session_state.scene
+
+@st.cache_resource
+def get_exporter():
+    """Encoded boards shared by all sessions, so an unchanged board is never encoded twice."""
+    return BoardExporter()
+
+@st.cache_resource
+def get_preview_exporter():
+    """Encoded preview frames, kept apart so streaming never evicts finished boards."""
+    return BoardExporter(max_entries=PREVIEW_ENTRIES)
+
+generator = get_generator()
+
+def board_key(elements):
+    """Identity of the drawn board: everything layout and rasterization read from the elements."""
+    identity = repr([(element.id, element.group, element.at, element.render_key()) for element in elements])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+def encode_elements(elements, scene, format=BOARD_FORMAT, preview=False):
+    """Draw elements with scene; returns the board encoded as format."""
+    key = board_key(elements)
+    exporter = get_preview_exporter() if preview else get_exporter()
+    data = exporter.cached(key, format)
+    if data is None:
+        surface, _ = scene.apply(elements)
+        data = exporter.export(surface, format, key=key)
+    return data
+
+def show_board(board, data, format):
+    # Pass the format so Streamlit serves the bytes as they are instead of re-encoding them
+    output_format = {"png": "PNG", "jpeg": "JPEG"}.get(format, "auto")
+    board.image(data, use_column_width=True, output_format=output_format)
+
+def syntax_digest(syntax):
+    return hashlib.sha256(syntax.encode("utf-8")).hexdigest()
+
+@st.cache_data(max_entries=RENDERED_BOARDS)
+def render_board(digest, _syntax, _scene):
+    """The encoded board, cached by the digest of its syntax; _syntax and _scene are not hashed by Streamlit."""
+    elements, _ = parse(_syntax)
+    return encode_elements(elements, _scene)
+
+def stream_whiteboard(syntax_lines, board, previous_elements):
+    """Draw each element into the board placeholder as soon as its line arrives.
+
+    Returns (syntax, elements, result), where result is the value syntax_lines returned.
+    """
+    lines = []
+    parser = Parser()
+    elements = parser.elements
+    shown = None
+    scene = get_renderer()
+    result = None
+
+    def collect():
+        nonlocal result
+        result = yield from syntax_lines
+
+    for line in collect():
+        lines.append(line)
+        if parser.feed(line) is None:
+            continue
+        # Until a tweak finishes, the rest of the previous board stays in place
+        frame = encode_elements(elements + previous_elements[len(elements):], scene, PREVIEW_FORMAT, preview=True)
+        if frame is not shown:  # A tweak line that repeats the old one leaves the board as it was
+            show_board(board, frame, PREVIEW_FORMAT)
+            shown = frame
+    _, diagnostics = parser.close()
+    if diagnostics:
+        st.warning("\n".join(f"Whiteboard Syntax {diagnostic}" for diagnostic in diagnostics))
+    return "\n".join(lines), elements, result
+
+# Initialize session state variables; besides its Scene, a session holds text, elements and encoded image bytes
 if 'problem_description' not in st.session_state:
     st.session_state.problem_description = ''
 if 'whiteboard_syntax' not in st.session_state:
     st.session_state.whiteboard_syntax = ''
 if 'elements' not in st.session_state:
     st.session_state.elements = []
-if 'content_surface' not in st.session_state:
-    st.session_state.content_surface = None
-if 'total_content_height' not in st.session_state:
-    st.session_state.total_content_height = 0
+if 'board_image' not in st.session_state:
+    st.session_state.board_image = None
 if 'is_first_input' not in st.session_state:
     st.session_state.is_first_input = True
 
@@ -54,6 +136,9 @@ else:
 user_input = st.text_input(instruction)
 submit_button = st.button("Submit")
 
+# The whiteboard image; filled progressively while a response streams in
+board = st.empty()
+
 # Process input when the submit button is clicked
 if submit_button and user_input.strip():
     user_input = user_input.strip()
@@ -62,10 +147,11 @@ if submit_button and user_input.strip():
         st.session_state.problem_description = user_input
         try:
             with st.spinner("Generating whiteboard..."):
-                # Generate whiteboard syntax using GPT
-                whiteboard_syntax = generator.generate_syntax(st.session_state.problem_description)
+                # Generate whiteboard syntax using GPT, drawing it as it streams in
+                whiteboard_syntax, elements, _ = stream_whiteboard(
+                    generator.stream_syntax(st.session_state.problem_description), board, []
+                )
                 st.session_state.whiteboard_syntax = whiteboard_syntax
-                elements = parse_syntax(whiteboard_syntax)
                 st.session_state.elements = elements
                 st.session_state.is_first_input = False
         except Exception as e:
@@ -75,42 +161,35 @@ if submit_button and user_input.strip():
         tweak_description = user_input
         try:
             with st.spinner("Updating whiteboard..."):
-                # Generate updated syntax using GPT
-                whiteboard_syntax = generator.generate_tweak(
-                    st.session_state.problem_description,
-                    st.session_state.whiteboard_syntax,
-                    tweak_description
+                # Generate updated syntax using GPT, drawing it as it streams in
+                whiteboard_syntax, elements, tweak_path = stream_whiteboard(
+                    generator.stream_tweak(
+                        st.session_state.problem_description,
+                        st.session_state.whiteboard_syntax,
+                        tweak_description
+                    ),
+                    board,
+                    st.session_state.elements
                 )
                 st.session_state.whiteboard_syntax = whiteboard_syntax
-                elements = parse_syntax(whiteboard_syntax)
                 st.session_state.elements = elements
+            st.caption(f"Tweak applied via the {tweak_path} path")
         except Exception as e:
             st.error(f"Error: {e}")
 
-# Render the whiteboard content if elements are available
+# Render the whiteboard only when its syntax changed; other reruns reuse the stored bytes
 if st.session_state.elements:
-    width = 1200  # Width of the content surface
-    height = 5000  # Height of the content surface (adjust as needed)
     try:
-        content_surface, total_content_height = render_whiteboard(
-            st.session_state.elements, width, height
+        st.session_state.board_image = render_board(
+            syntax_digest(st.session_state.whiteboard_syntax), st.session_state.whiteboard_syntax, get_renderer()
         )
-        st.session_state.content_surface = content_surface
-        st.session_state.total_content_height = total_content_height
     except Exception as e:
         st.error(f"Error rendering whiteboard: {e}")
 
 # Display the rendered image in Streamlit
-if st.session_state.content_surface:
-    # Convert the Pygame surface to a PIL image
-    image = surface_to_image(st.session_state.content_surface)
-    # Crop the image to the total content height to remove empty space
-    image = image.crop((0, 0, width, st.session_state.total_content_height))
-    # Display the image in Streamlit
-    st.image(image, use_column_width=True)
-
-    # Optionally, save the image locally for testing purposes
-    # image.save('whiteboard_output.png')
+if st.session_state.board_image:
+    # The image is already sized to the content
+    show_board(board, st.session_state.board_image, BOARD_FORMAT)
 
 # Optional: Display the whiteboard syntax for debugging
 with st.expander("Show Whiteboard Syntax"):
@@ -0,0 +1,288 @@
+import re
+
+# Palette the model chooses colors from
+COLORS = {
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "grey": (128, 128, 128),
+    "darkred": (139, 0, 0),
+    "darkgreen": (0, 100, 0),
+    "purple": (128, 0, 128),
+    "orange": (255, 165, 0),
+    "darkblue": (0, 0, 139),
+    "darkgrey": (105, 105, 105),
+}
+
+DEFAULT_COLOR = (0, 0, 0)
+DEFAULT_SIZE = 20
+
+# "[type" at the start of a line, after optional indentation
+_HEADER = re.compile(r"[ \t]*\[[ \t]*(end[ \t]+group\b|[A-Za-z_][\w-]*)")
+# One token after the header: an attribute with its value, the closing bracket, or stray text.
+# The matched group number (lastindex) tells the token kind apart.
+_TOKEN = re.compile(r"""
+    [ \t]*(?:
+        ([A-Za-z_]\w*)[ \t]*=[ \t]*(?:
+            "([^"\\]*(?:\\.[^"\\]*)*)"  # 2: quoted string, \" escapes a quote
+          | \(([^()]*)\)                 # 3: tuple
+          | ([^\s\]"()]+)               # 4: bare word or number
+          | ("[^\n]*|\([^\n]*|)         # 5: unterminated string or tuple, or no value
+        )
+      | (\])                              # 6: end of the header
+      | ([^\s\]]+)                        # 7: anything else
+    )""", re.VERBOSE)
+_ESCAPED_QUOTE = re.compile(r'\\(")')
+_INTEGER = re.compile(r"[+-]?\d+")
+_NUMBER = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_HEX_COLOR = re.compile(r"#?([0-9a-fA-F]{6})")
+# A line in the attribute order the prompt asks for, matched in one call
+_CANONICAL = re.compile(
+    r'\[([a-z]+) id=([^\s\]"()\[]+)\]'
+    r'(?: content="([^"]*)")?(?: at=\((-?\d+), ?(-?\d+)\))?(?: color=([a-z]+))?(?: size=(\d+))?[ \t]*'
+)
+_CANONICAL_GROUP = re.compile(r'\[group id=([^\s\]"()\[]+) at=\((-?\d+), ?(-?\d+)\)\][ \t]*')
+# Attributes whose bare values stay text even when they look like numbers (equation=5 is the constant 5)
+_TEXT_KEYS = ("id", "content", "equation")
+
+
+class Element:
+    """One parsed Whiteboard Syntax line with typed fields.
+
+    color is an RGB tuple, size an int and at an (x, y) tuple or None when
+    the element has no position. Attributes without a dedicated field, such
+    as a graph's equation and domain, are kept in attrs. line is the
+    1-based source line and group the id of the enclosing group.
+    """
+
+    __slots__ = ("type", "id", "content", "color", "size", "at", "attrs", "line", "group")
+
+    def __init__(self, type, id=None, content="", color=DEFAULT_COLOR, size=DEFAULT_SIZE, at=None,
+                 attrs=None, line=0, group=None):
+        self.type = type
+        self.id = id
+        self.content = content
+        self.color = color
+        self.size = size
+        self.at = at
+        self.attrs = attrs if attrs is not None else {}
+        self.line = line
+        self.group = group
+
+    def render_key(self):
+        """Everything the rasterized layer depends on; position, id and line number are left out."""
+        return (self.type, self.content, self.color, self.size, tuple(sorted(self.attrs.items())))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__[1:])
+        return f"Element({self.type!r}, {fields})"
+
+
+class Diagnostic:
+    """A problem found while parsing, located by 1-based line and column."""
+
+    __slots__ = ("line", "column", "message", "severity")
+
+    def __init__(self, line, column, message, severity="error"):
+        self.line = line
+        self.column = column
+        self.message = message
+        self.severity = severity  # "error" drops the line, "warning" keeps it with a default
+
+    def __str__(self):
+        return f"line {self.line}, column {self.column}: {self.severity}: {self.message}"
+
+    def __repr__(self):
+        return f"Diagnostic({self.line}, {self.column}, {self.message!r}, {self.severity!r})"
+
+
+def _number(text):
+    if text.isdigit():
+        return int(text)
+    if _INTEGER.fullmatch(text):
+        return int(text)
+    if _NUMBER.fullmatch(text):
+        return float(text)
+    return None
+
+
+def _tuple(text):
+    values = tuple(_number(part.strip()) for part in text.split(","))
+    return None if None in values else values
+
+
+def _color(value):
+    if isinstance(value, tuple):
+        if len(value) == 3 and all(isinstance(v, int) and 0 <= v <= 255 for v in value):
+            return value
+        return None
+    name = str(value).lower()
+    if name in COLORS:
+        return COLORS[name]
+    name = name.replace("gray", "grey")
+    if name in COLORS:
+        return COLORS[name]
+    match = _HEX_COLOR.fullmatch(name)
+    if match:
+        return tuple(int(match.group(1)[i:i + 2], 16) for i in (0, 2, 4))
+    return None
+
+
+def _assign(element, key, value):
+    """Store an attribute value on its typed field; returns a problem description, or None."""
+    if key == "content":
+        element.content = str(value)
+    elif key == "at":
+        if not (isinstance(value, tuple) and len(value) == 2):
+            return f"at must be an (x, y) tuple, not {value!r}"
+        element.at = (int(value[0]), int(value[1]))
+    elif key == "color":
+        color = _color(value)
+        if color is None:
+            return f"unknown color {value!r}"
+        element.color = color
+    elif key == "size":
+        if not (isinstance(value, (int, float)) and value > 0):
+            return f"size must be a positive number, not {value!r}"
+        element.size = int(value)
+    elif key == "id":
+        element.id = str(value)
+    else:
+        element.attrs[key] = value
+    return None
+
+
+def _fast_element(line):
+    """Element for a line written exactly as the prompt lays it out, or None when the line needs _scan.
+
+    Such lines are nearly all of a model's output, and one regex match is
+    cheaper than tokenizing them attribute by attribute. Anything else,
+    including every line with a problem to report, is left to _scan.
+    """
+    if line[:1] != "[" or '\\"' in line:
+        return None
+    match = _CANONICAL.fullmatch(line)
+    if match is not None:
+        element_type, element_id, content, x, y, color, size = match.groups()
+        if element_type == "end" or (color is not None and color not in COLORS) or (size and not int(size)):
+            return None
+        return Element(
+            element_type, element_id, content or "", COLORS[color] if color else DEFAULT_COLOR,
+            int(size) if size else DEFAULT_SIZE, (int(x), int(y)) if x else None,
+        )
+    if line.rstrip() == "[end group]":
+        return Element("end group")
+    match = _CANONICAL_GROUP.fullmatch(line)
+    if match is not None:
+        element_id, x, y = match.groups()
+        return Element("group", element_id, at=(int(x), int(y)))
+    return None
+
+
+class Parser:
+    """Incremental Whiteboard Syntax parser.
+
+    feed() takes one line at a time, so a response can be parsed while it
+    streams in, and returns the Element it produced (None for blank,
+    comment and invalid lines). Elements and diagnostics accumulate on the
+    parser; close() reports groups that were never closed.
+    """
+
+    def __init__(self):
+        self.elements = []
+        self.diagnostics = []
+        self.line_number = 0
+        self._groups = []  # Ids of the open groups, innermost last
+
+    def feed(self, line):
+        self.line_number += 1
+        line = line.rstrip("\r\n")
+        element = _fast_element(line) or self._scan(line, self.line_number)
+        if element is None:
+            return None
+
+        element.line = self.line_number
+        if element.type == "end group":
+            if self._groups:
+                self._groups.pop()
+            else:
+                self._error(self.line_number, line.index("[") + 1, "[end group] without an open group", "warning")
+        if self._groups:
+            element.group = self._groups[-1]
+        if element.type == "group":
+            self._groups.append(element.id)
+        self.elements.append(element)
+        return element
+
+    def close(self):
+        for group in self._groups:
+            self.diagnostics.append(Diagnostic(self.line_number, 1, f"group {group} is never closed", "warning"))
+        self._groups = []
+        return self.elements, self.diagnostics
+
+    def _error(self, line_number, column, message, severity="error"):
+        self.diagnostics.append(Diagnostic(line_number, column, message, severity))
+
+    def _scan(self, line, line_number):
+        """Tokenize a line with the full grammar, reporting every problem with its column."""
+        header = _HEADER.match(line)
+        if header is None:
+            stripped = line.strip()
+            if stripped and not stripped.startswith("#"):
+                column = len(line) - len(line.lstrip()) + 1
+                self._error(line_number, column, "expected an element such as [text ...]")
+            return None
+
+        element_type = header.group(1).lower()
+        if " " in element_type or "\t" in element_type:
+            element_type = "end group"  # Only "end group" has whitespace in its type
+        element = Element(element_type)
+        closed = False
+        for match in _TOKEN.finditer(line, header.end()):
+            kind = match.lastindex
+            if kind == 6:
+                if closed:
+                    self._error(line_number, match.start(6) + 1, "unexpected ']'", "warning")
+                closed = True
+                continue
+            if kind == 7:
+                self._error(line_number, match.start(7) + 1, f"unexpected text {match.group(7)!r}", "warning")
+                continue
+
+            key = match.group(1).lower()
+            if kind == 2:
+                value = match.group(2)
+                if '\\"' in value:
+                    value = _ESCAPED_QUOTE.sub(r"\1", value)
+            elif kind == 3:
+                value = _tuple(match.group(3))
+                if value is None:
+                    self._error(line_number, match.start(1) + 1, f"{key} must be a tuple of numbers", "warning")
+                    continue
+            elif kind == 4:
+                value = match.group(4)
+                number = None if key in _TEXT_KEYS else _number(value)
+                if number is not None:
+                    value = number
+            else:
+                message = "unterminated value" if match.group(5) else "missing value"
+                self._error(line_number, match.start(1) + 1, f"{message} for {key}", "warning")
+                continue
+
+            problem = _assign(element, key, value)
+            if problem is not None:
+                self._error(line_number, match.start(1) + 1, problem, "warning")
+
+        if not closed:
+            self._error(line_number, len(line) + 1, "missing ']' after the element type", "warning")
+        return element
+
+
+def parse(syntax):
+    """Parse a whole board; returns (elements, diagnostics)."""
+    parser = Parser()
+    for line in syntax.split("\n"):
+        parser.feed(line)
+    return parser.close()
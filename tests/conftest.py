@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root; pygame must not open a window
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["WHITEBOARD_CACHE_DIR"] = ""
+
+
+@pytest.fixture
+def serve():
+    """Start mock OpenAI servers with the given settings; returns (server, settings), shut down after the test."""
+    import mock_openai
+
+    servers = []
+
+    def start(**settings):
+        server = mock_openai.serve(**settings)
+        servers.append(server)
+        return server, server.RequestHandlerClass.settings
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+from openai import AsyncOpenAI, RateLimitError
+
+from bulk import AsyncWhiteboardGenerator, RateLimiter, backoff_delay, read_problems
+from gpt import BACKOFF_BASE, BACKOFF_CAP
+from response_cache import ResponseCache
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://test"))
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_backoff_grows_and_is_capped():
+    for attempt in range(12):
+        delays = [backoff_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) for delay in delays)
+    assert max(backoff_delay(10) for _ in range(200)) > BACKOFF_CAP / 2
+
+
+def test_backoff_honours_retry_after():
+    assert backoff_delay(0, rate_limit_error("7")) >= 7
+    assert backoff_delay(0, rate_limit_error("Wed, 21 Oct 2026 07:28:00 GMT")) <= BACKOFF_BASE  # Dates are ignored
+    assert backoff_delay(0, SimpleNamespace(response=None)) <= BACKOFF_BASE
+
+
+def test_rate_limiter_waits_for_refill():
+    async def scenario():
+        limiter = RateLimiter(per_minute=600)  # 10 per second
+        start = time.monotonic()
+        await limiter.acquire(600)  # A full bucket is available at once
+        assert time.monotonic() - start < 0.1
+        await limiter.acquire(3)
+        waited = time.monotonic() - start
+        limiter.debit(2)  # Usage beyond the reservation delays the next request
+        await limiter.acquire(1)
+        return waited, time.monotonic() - start
+
+    waited, total = asyncio.run(scenario())
+    assert 0.25 <= waited < 2  # About 0.3 s; the upper bound only rules out waiting for a whole refill
+    assert total - waited >= 0.25
+
+
+def test_oversized_requests_still_get_through():
+    async def scenario():
+        limiter = RateLimiter(per_minute=60)
+        await limiter.acquire(1000)
+        return limiter.level
+
+    assert asyncio.run(scenario()) < 1
+
+
+def bulk_generator(server, **options):
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return AsyncWhiteboardGenerator(
+        client=AsyncOpenAI(api_key="sk-test", base_url=url, max_retries=0), layout="absolute", **options
+    )
+
+
+def collect(generator, problems, **options):
+    async def scenario():
+        return [result async for result in generator.generate_many(problems, **options)]
+
+    return asyncio.run(scenario())
+
+
+def test_generate_many_yields_every_problem_and_warms_the_cache(serve):
+    server, settings = serve(delay=0.05)
+    cache = ResponseCache(":memory:")
+    problems = [f"problem {n}" for n in range(6)]
+    results = collect(bulk_generator(server, cache=cache, concurrency=3), problems)
+    assert sorted(result["index"] for result in results) == list(range(6))
+    assert all(f"Problem: problem {result['index']}" in result["syntax"] for result in results)
+    assert settings.requests == 6
+
+    again = collect(bulk_generator(server, cache=cache), problems)
+    assert [result["error"] for result in again] == [None] * 6
+    assert settings.requests == 6  # Every answer came from the cache
+
+
+def test_generate_many_reads_problems_lazily(serve):
+    server, _ = serve(delay=0.05)
+    consumed = []
+
+    def problems():
+        for n in range(20):
+            consumed.append(n)
+            yield f"problem {n}"
+
+    async def scenario():
+        generator = bulk_generator(server, concurrency=2)
+        async for _ in generator.generate_many(problems(), window=3):
+            return len(consumed)
+
+    assert asyncio.run(scenario()) <= 4
+
+
+def test_failures_are_reported_per_problem(serve):
+    server, settings = serve(delay=0.01, error_rate=1.0, retry_after="0.05")
+    generator = bulk_generator(server, max_retries=1)
+    results = collect(generator, ["a", "b"])
+    assert all(result["syntax"] is None and "RateLimitError" in result["error"] for result in results)
+    assert settings.requests == 4 and generator.retries == 2
+
+
+def test_rate_limits_are_retried(serve):
+    server, settings = serve(delay=0.01, error_rate=1.0, retry_after="0.2")
+    threading.Timer(0.1, setattr, (settings, "error_rate", 0.0)).start()
+    generator = bulk_generator(server)
+    [result] = collect(generator, ["retried"])
+    assert result["error"] is None and generator.retries >= 1
+
+
+def test_bad_rows_are_reported_without_stopping_the_run(tmp_path, serve):
+    path = tmp_path / "problems.jsonl"
+    path.write_text(
+        '"plain string"\n'
+        '{"id": "a", "problem": "object"}\n'
+        '\n'
+        '{"id": "b", "question": "wrong field"}\n'
+        '{not json\n'
+        '[1, 2]\n'
+        '{"problem": "last"}\n',
+        encoding="utf-8",
+    )
+    records = list(read_problems(str(path)))
+    assert [record["index"] for record in records] == [0, 1, 3, 4, 5, 6]
+    assert [record["problem"] for record in records] == ["plain string", "object", None, None, None, "last"]
+    assert records[2]["id"] == "b" and "'problem'" in records[2]["error"]
+    assert "Invalid JSON on line 5" in records[3]["error"]
+
+    server, settings = serve(delay=0.01)
+    results = {result["index"]: result for result in collect(bulk_generator(server), records)}
+    assert [index for index, result in sorted(results.items()) if result["error"]] == [3, 4, 5]
+    assert settings.requests == 3
+
+
+class ThreadRecordingCache(ResponseCache):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def put(self, key, value):
+        self.threads.add(threading.get_ident())
+        super().put(key, value)
+
+
+def test_cache_calls_run_off_the_event_loop(serve):
+    server, _ = serve(delay=0.01)
+    cache = ThreadRecordingCache()
+
+    async def scenario():
+        generator = bulk_generator(server, cache=cache)
+        await generator.generate_syntax("threaded")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert cache.threads and loop_thread not in cache.threads
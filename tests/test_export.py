@@ -0,0 +1,78 @@
+import io
+import random
+
+import pygame
+import pytest
+from PIL import Image
+
+from export import BoardExporter, export_surface, pixel_digest, surface_to_image
+
+
+def reference(surface, rect):
+    rect = pygame.Rect(rect).clip(surface.get_rect())
+    image = Image.frombytes("RGBA", surface.get_size(), pygame.image.tobytes(surface, "RGBA"))
+    return image.crop((rect.x, rect.y, rect.right, rect.bottom))
+
+
+def noise_surface(width, height, rng):
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    for _ in range(40):
+        surface.set_at((rng.randrange(width), rng.randrange(height)), [rng.randrange(256) for _ in range(4)])
+    return surface
+
+
+def rgba_order_surface(width, height, rng):
+    # render_latex and render_pool build surfaces like this one, with bytes in RGBA order
+    data = bytes(rng.randrange(256) for _ in range(width * height * 4))
+    return pygame.image.frombuffer(data, (width, height), "RGBA")
+
+
+@pytest.mark.parametrize("make", [noise_surface, rgba_order_surface])
+def test_crops_match_pygame_conversion(make):
+    rng = random.Random(7)
+    for _ in range(100):
+        width, height = rng.randint(1, 40), rng.randint(1, 40)
+        surface = make(width, height, rng)
+        rect = (rng.randint(-5, width), rng.randint(-5, height), rng.randint(0, width + 5), rng.randint(0, height + 5))
+        image = surface_to_image(surface, rect)
+        expected = reference(surface, rect)
+        assert image.size == expected.size
+        assert image.tobytes() == expected.tobytes()
+
+
+def test_partial_width_rect_of_rgba_order_surface():
+    surface = rgba_order_surface(40, 40, random.Random(1))
+    for rect in [(10, 10, 20, 20), (10, 20, 20, 20), (39, 39, 1, 1)]:
+        assert surface_to_image(surface, rect).tobytes() == reference(surface, rect).tobytes()
+
+
+def test_subsurface_and_surface_unlocked_after_export():
+    surface = noise_surface(30, 20, random.Random(2))
+    sub = surface.subsurface((3, 2, 20, 15))
+    assert surface_to_image(sub, (1, 1, 10, 10)).tobytes() == reference(sub, (1, 1, 10, 10)).tobytes()
+    surface.fill((0, 0, 0))  # Raises if the pixel buffer were still locked
+    assert not surface.get_locked()
+
+
+@pytest.mark.parametrize("format, mode", [("png", "RGBA"), ("webp", "RGBA"), ("jpeg", "RGB")])
+def test_encodings(format, mode):
+    surface = pygame.Surface((60, 30), pygame.SRCALPHA)
+    pygame.draw.circle(surface, (200, 0, 0, 255), (30, 15), 10)
+    image = Image.open(io.BytesIO(export_surface(surface, format, (0, 0, 60, 20))))
+    assert image.format == format.upper()
+    assert image.size == (60, 20)
+    assert image.mode == mode
+
+
+def test_exporter_reuses_unchanged_boards():
+    surface = noise_surface(20, 20, random.Random(3))
+    exporter = BoardExporter(max_entries=2)
+    first = exporter.export(surface)
+    assert exporter.export(surface) is first
+    assert exporter.cached(pixel_digest(surface)) is first
+    assert (exporter.hits, exporter.misses) == (2, 1)
+
+    exporter.export(surface, "jpeg", key="board", quality=50)
+    assert exporter.cached("board", "jpeg") is None  # Options are part of the entry
+    exporter.export(surface, "webp", key="board")
+    assert len(exporter._encoded) == 2
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+import pytest
+
+from expr import MAX_LENGTH, ExpressionError, compile_expression, evaluate_many
+
+X = np.array([1.0, 2.0, 3.0])
+
+
+@pytest.mark.parametrize("source", [
+    "__import__('os').system('echo hi')",
+    "eval('1')",
+    "open('f')",
+    "getattr(x, 'y')",
+    "x.__class__",
+    "().__class__.__bases__",
+    "np.linalg.inv(x)",
+    "(lambda: 1)()",
+    "[x for x in ()]",
+    "x if x else 1",
+    "x[0]",
+    "{}",
+    "'abc'",
+    "True",
+    "x < 1",
+    "x @ x",
+    "~x",
+    "x << 2",
+    "sin",
+    "sin(x, out=x)",
+    "_secret",
+    "y = x^2",
+    "x" * (MAX_LENGTH + 1),
+])
+def test_rejected(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)(X)
+
+
+def test_huge_power_fails_fast():
+    start = time.monotonic()
+    with pytest.raises(ExpressionError):
+        compile_expression("10**10**10")(X)
+    assert time.monotonic() - start < 1.0  # Floats overflow instead of building a huge int
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("x^2", X ** 2),
+    ("x^2 + 1", X ** 2 + 1),
+    ("2*x^2", 2 * X ** 2),
+    ("-x^2", -X ** 2),
+    ("(x + 1)^2 / 2", (X + 1) ** 2 / 2),
+    ("2^x^2", 2 ** X ** 2),
+    ("2*x + 1", 2 * X + 1),
+    ("np.sin(x)", np.sin(X)),
+    ("math.pi*x", np.pi * X),
+    ("ln(x)", np.log(X)),
+    ("5", np.full(3, 5.0)),
+])
+def test_accepted(source, expected):
+    np.testing.assert_allclose(compile_expression(source)(X), expected)
+
+
+def test_deep_nesting_is_an_expression_error():
+    with pytest.raises(ExpressionError):
+        compile_expression("-" * (MAX_LENGTH - 1) + "x")
+
+
+def test_parameters_and_cache():
+    compiled = compile_expression("a*x")
+    assert compiled.parameters == ("a",)
+    np.testing.assert_allclose(compiled(X, a=3), 3 * X)
+    with pytest.raises(ExpressionError):
+        compiled(X)
+    assert compile_expression("a*x") is compiled
+
+
+def test_evaluate_many():
+    assert evaluate_many(["x", "x^2"], X).shape == (2, 3)
+    np.testing.assert_allclose(evaluate_many(["a*x"], [1, 2], [{"a": 1}, {"a": 2}]), [[[1, 2], [2, 4]]])
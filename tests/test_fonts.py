@@ -0,0 +1,52 @@
+import threading
+
+import pygame
+
+import fonts
+from fonts import get_font, render_line
+from render import render_text
+from render_cache import SurfaceLRU, surface_nbytes
+
+
+def test_fonts_are_loaded_once_per_size():
+    assert get_font(24) is get_font(24.0)
+    assert get_font(24) is not get_font(25)
+
+
+def test_concurrent_loads_share_one_font():
+    size = 47  # Not loaded by any other test
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(get_font(size))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(font) for font in loaded}) == 1
+
+
+def test_render_line_reuses_identical_text():
+    first = render_line("cached line", 20, (0, 0, 255))
+    assert render_line("cached line", 20, [0, 0, 255]) is first  # Colors compare as tuples
+    assert render_line("cached line", 20, (255, 0, 0)) is not first
+    assert render_line("cached line", 21, (0, 0, 255)) is not first
+    expected = pygame.font.Font(None, 20).render("cached line", True, (0, 0, 255))
+    assert pygame.image.tobytes(first, "RGBA") == pygame.image.tobytes(expected, "RGBA")
+
+
+def test_wrapped_text_is_cached_too():
+    text = "a sentence long enough to wrap onto several lines of the board"
+    first = render_text(text, 20, (0, 0, 0), 120)
+    assert first.get_width() <= 120
+    assert render_text(text, 20, (0, 0, 0), 120) is first
+    assert render_text(text, 20, (0, 0, 0), 200) is not first
+
+
+def test_text_cache_stays_within_its_budget(monkeypatch):
+    sample = render_line("line 0", 20, (0, 0, 0))
+    budget = surface_nbytes(sample) * 5
+    monkeypatch.setattr(fonts, "text_cache", SurfaceLRU(budget))
+    for n in range(50):
+        render_line(f"line {n}", 20, (0, 0, 0))
+    assert fonts.text_cache.current_bytes <= budget
+    assert fonts.text_cache.evictions > 0
+    assert fonts.text_cache.get((None, "line 49", 20, (0, 0, 0), True)) is not None
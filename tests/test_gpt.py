@@ -0,0 +1,44 @@
+from gpt import PROMPT_PREFIXES, TWEAK_TASKS, GPTWhiteboardGenerator, tweak_messages
+
+SYNTAX = '[text id=1] content="Problem: x" at=(50,50) color=black size=30'
+
+
+def tweak(generator, text):
+    """Lines streamed for the tweak, and the path stream_tweak returned."""
+    lines = []
+    stream = generator.stream_tweak("x", SYNTAX, text)
+    while True:
+        try:
+            lines.append(next(stream))
+        except StopIteration as stop:
+            return lines, stop.value
+
+
+def test_stream_tweak_returns_the_local_path():
+    generator = GPTWhiteboardGenerator("sk-test", base_url="http://127.0.0.1:9/v1", layout="absolute")
+    lines, path = tweak(generator, "make the title red")
+    assert path == "local"
+    assert lines == [SYNTAX.replace("black", "red")]
+    assert generator.tweak_paths == {"local": 1}
+
+
+def test_stream_tweak_returns_the_full_path(serve):
+    server, settings = serve(delay=0.01, chunk_delay=0.001)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    generator = GPTWhiteboardGenerator("sk-test", base_url=url, tweak_mode="full", layout="absolute")
+    lines, path = tweak(generator, "explain it with a picture")
+    assert path == "full"
+    assert lines and settings.requests == 1
+    assert generator.tweak_paths == {"full": 1}
+
+
+def test_prefixes_show_single_braces():
+    for prefix in PROMPT_PREFIXES.values():
+        assert "{{" not in prefix and "\\frac{d}{dx}" in prefix
+
+
+def test_flow_tweaks_reorder_instead_of_positioning():
+    messages = tweak_messages("x", SYNTAX, "move the answer up", task=TWEAK_TASKS["flow"], layout="flow")
+    task = messages[1]["content"]
+    assert "Never write at=(x, y)" in task and "adjusting positions" not in task
+    assert "adjusting positions" in TWEAK_TASKS["absolute"]
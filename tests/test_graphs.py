@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from expr import compile_expression
+from render import rasterize_graph
+from sampling import DEFAULT_DOMAIN, plot_domain, sample_curve
+from scene import Scene
+from syntax import parse
+
+
+@pytest.mark.parametrize("domain, expected", [
+    ((-2, 3), (-2.0, 3.0)),
+    ((5, -5), (-5.0, 5.0)),
+    ((0, 0), (-1.0, 1.0)),
+    ((0, float("inf")), DEFAULT_DOMAIN),
+    ((1, "a"), DEFAULT_DOMAIN),
+    ((1, 2, 3), DEFAULT_DOMAIN),
+    (5, DEFAULT_DOMAIN),
+])
+def test_plot_domain(domain, expected):
+    assert plot_domain(domain) == expected
+
+
+def test_degenerate_domain_samples():
+    segments, ylim = sample_curve(compile_expression("x^2"), (0, 0), 300)
+    assert segments and all(np.isfinite(y).all() for _, y in segments)
+
+
+@pytest.mark.parametrize("backend", ["native", "matplotlib"])
+@pytest.mark.parametrize("equation", ["y = x^2", "a*x", "sin(1, 2, 3)", "__import__('os')", 5])
+def test_invalid_equation_draws_a_labelled_plot(equation, backend):
+    surface = rasterize_graph(equation, (-1, 1), 200, (0, 0, 255), backend)
+    assert surface.get_width() > 0 and surface.get_height() > 0
+
+
+def test_invalid_graph_keeps_the_rest_of_the_board():
+    elements, _ = parse(
+        '[text id=1] content="Before" size=20\n'
+        '[graph id=2] equation="y = x^2" domain=(0,0) size=200\n'
+        '[text id=3] content="After" size=20'
+    )
+    surface, height = Scene(600, mode="flow").apply(elements)
+    assert height > 200
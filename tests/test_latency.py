@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from gpt import GPTWhiteboardGenerator, LatencyPolicy
+
+
+def generator(server, **policy):
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return GPTWhiteboardGenerator("sk-test", base_url=url, latency=LatencyPolicy(**policy))
+
+
+def test_hedging_is_off_by_default(serve):
+    server, settings = serve(delay=0.3)
+    assert not LatencyPolicy().hedge
+    model = generator(server, hedge_delay=0.05)
+    assert "Problem: sine" in model.generate_syntax("sine")
+    assert settings.requests == 1
+    assert [record["hedge"] for record in model.last_attempts] == [False]
+
+
+def test_hedge_wins_over_a_stalled_attempt(serve):
+    server, settings = serve(delay=0.01, slow_rate=1.0, slow_delay=3.0)
+    # Only the first request stalls; the hedge sent after 0.3 s answers at once
+    threading.Timer(0.15, setattr, (settings, "slow_rate", 0.0)).start()
+    model = generator(server, hedge=True, hedge_delay=0.3)
+    start = time.monotonic()
+    model.generate_syntax("cosine")
+    assert time.monotonic() - start < 2.0
+    assert settings.requests == 2
+    assert model.hedges == {"sent": 1, "won": 1}
+    assert [record["outcome"] for record in model.last_attempts] == ["abandoned", "ok"]
+
+
+def test_streamed_hedge(serve):
+    server, settings = serve(delay=0.01, slow_rate=1.0, slow_delay=3.0, chunk_delay=0.001)
+    threading.Timer(0.15, setattr, (settings, "slow_rate", 0.0)).start()
+    model = generator(server, hedge=True, hedge_delay=0.3)
+    lines = list(model.stream_syntax("tangent"))
+    assert len(lines) == 5 and "Problem: tangent" in lines[0]
+    assert model.hedges["won"] == 1
+
+
+def test_deadline(serve):
+    server, _ = serve(delay=3.0)
+    model = generator(server, deadline=0.5)
+    start = time.monotonic()
+    with pytest.raises(Exception, match="No response from the model"):
+        model.generate_syntax("slow")
+    assert time.monotonic() - start < 1.5
+
+
+def test_rate_limits_are_retried_up_to_max_attempts(serve):
+    server, settings = serve(error_rate=1.0)
+    model = generator(server, max_attempts=2)
+    with pytest.raises(Exception, match="Rate limit"):
+        model.generate_syntax("limited")
+    assert settings.requests == 2
+
+
+def test_retry_waits_for_retry_after(serve):
+    server, settings = serve(delay=0.01, error_rate=1.0, retry_after="1.5")
+    threading.Timer(0.5, setattr, (settings, "error_rate", 0.0)).start()
+    model = generator(server)
+    start = time.monotonic()
+    assert "Problem: limited" in model.generate_syntax("limited")
+    # Backoff alone waits at most 1 s before the first retry
+    assert time.monotonic() - start >= 1.5
+    assert settings.requests == 2
+    assert model.last_attempts[1]["started"] >= 1.5
+
+
+def test_no_retry_past_the_deadline(serve):
+    server, settings = serve(delay=0.01, error_rate=1.0, retry_after="5")
+    model = generator(server, deadline=1.0)
+    start = time.monotonic()
+    with pytest.raises(Exception, match="Rate limit"):
+        model.generate_syntax("limited")
+    assert time.monotonic() - start < 0.5  # The error is reported instead of sleeping past the deadline
+    assert settings.requests == 1
+
+
+def test_blocking_calls_may_read_until_the_deadline(serve):
+    server, _ = serve(delay=0.6)
+    model = generator(server, read_timeout=0.2)
+    assert "Problem: slow" in model.generate_syntax("slow")
+    policy = LatencyPolicy(deadline=90, read_timeout=30)
+    assert policy.timeout(90).read == 90
+    assert policy.timeout(90, streamed=True).read == 30
@@ -0,0 +1,99 @@
+import pygame
+import pytest
+
+from fonts import get_font
+from render import (
+    BOTTOM_MARGIN, FLOW_GAP, GROUP_SPACING, LEFT_MARGIN, SPACING, TOP_MARGIN, layout, render_whiteboard, wrap_text,
+)
+from syntax import parse
+
+
+def layers_of(elements, height=30):
+    """A blank layer of the given height for every element that draws something."""
+    return [
+        None if element.type in ("group", "end group") else pygame.Surface((100, height), pygame.SRCALPHA)
+        for element in elements
+    ]
+
+
+def test_unpositioned_elements_flow_below_a_positioned_one():
+    elements, _ = parse(
+        '[text id=1] content="a" at=(80,100) size=20\n'
+        '[text id=2] content="b" size=20\n'
+        '[text id=3] content="c" size=20'
+    )
+    positions, height = layout(elements, layers_of(elements), "absolute")
+    # They keep the board's left edge and continue below the element before them
+    assert positions == [(80, 100), (LEFT_MARGIN, 100 + 30 + SPACING), (LEFT_MARGIN, 100 + 2 * (30 + SPACING))]
+    assert height == 100 + 2 * (30 + SPACING) + 30 + BOTTOM_MARGIN
+
+
+def test_group_members_flow_from_the_group_origin():
+    elements, _ = parse(
+        '[text id=1] content="before" size=20\n'
+        '[group id=g at=(300,200)]\n'
+        '[text id=2] content="a" size=20\n'
+        '[text id=3] content="b" at=(320,400) size=20\n'
+        '[text id=4] content="c" size=20\n'
+        '[end group]\n'
+        '[text id=5] content="after" size=20'
+    )
+    positions, _ = layout(elements, layers_of(elements), "absolute")
+    assert positions[0] == (LEFT_MARGIN, TOP_MARGIN)
+    assert positions[2] == (300, 200)
+    assert positions[3] == (320, 400)
+    assert positions[4] == (300, 400 + 30 + SPACING)  # The group's left edge, below the member before it
+    assert positions[5] is None
+    # After the group the board continues at the outer left edge, below the group's lowest member
+    assert positions[6] == (LEFT_MARGIN, 400 + 2 * (30 + SPACING))
+
+
+def test_flow_mode_ignores_at_and_scales_the_gap():
+    elements, _ = parse(
+        '[text id=1] content="a" at=(500,500) size=40\n'
+        '[group id=g at=(300,300)]\n'
+        '[graph id=2] equation="x" size=200\n'
+        '[end group]\n'
+        '[text id=3] content="b" size=20'
+    )
+    positions, _ = layout(elements, layers_of(elements), "flow")
+    gap = round(40 * FLOW_GAP)
+    group_y = TOP_MARGIN + 30 + gap + GROUP_SPACING
+    assert positions[0] == (LEFT_MARGIN, TOP_MARGIN)
+    assert positions[1] == positions[2] == (LEFT_MARGIN, group_y)
+    # A graph is followed by the fixed SPACING, and the group is set off by GROUP_SPACING
+    assert positions[4] == (LEFT_MARGIN, group_y + 30 + SPACING + GROUP_SPACING)
+
+
+def test_surface_is_as_tall_as_its_content():
+    def board(last_y):
+        elements, _ = parse(
+            '[text id=1] content="Problem: one" at=(50,40) size=30\n'
+            f'[text id=2] content="Answer: two" at=(50,{last_y}) size=30'
+        )
+        return render_whiteboard(elements, 800)
+
+    surface, height = board(700)
+    assert surface.get_size() == (800, height)
+    assert height > 700 + BOTTOM_MARGIN
+    assert board(300)[1] == height - 400  # Moving the lowest element up shrinks the board with it
+
+
+def test_render_whiteboard_options_are_keyword_only():
+    elements, _ = parse('[text id=1] content="a" size=20')
+    with pytest.raises(TypeError):
+        render_whiteboard(elements, 400, None, "flow")
+    assert render_whiteboard(elements, 400, workers=None, mode="flow")[0].get_width() == 400
+
+
+@pytest.mark.parametrize("text", [
+    "short",
+    "the quick brown fox jumps over the lazy dog " * 4,
+    "a" * 80 + " tail",
+])
+def test_wrap_text_fits_and_keeps_every_character(text):
+    font = get_font(20)
+    lines = wrap_text(font, text, 150)
+    assert all(font.size(line)[0] <= 150 for line in lines)
+    assert "".join(lines).replace(" ", "") == text.replace(" ", "")
+    assert len(lines) > 1 or font.size(text)[0] <= 150
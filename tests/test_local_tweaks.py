@@ -0,0 +1,69 @@
+import pytest
+
+from local_tweaks import MIN_SIZE, MOVE_STEP, SIZE_STEP, interpret_tweak
+from patch import apply_patch
+from syntax import parse
+
+BOARD = "\n".join([
+    '[text id=1] content="Problem: Differentiate x^3" at=(50,50) color=darkred size=36',
+    '[annotation id=2] content="Step 1: Use the power rule" at=(50,120) color=darkgreen size=28',
+    '[math id=3] content="$3x^2$" at=(50,180) color=purple size=32',
+    '[text id=4] content="Answer: 3x^2" at=(50,240) color=green size=34',
+    '[group id=5 at=(50,320)]',
+    '[text id=6] content="Extra Practice: Differentiate x^4" color=darkblue size=28',
+    '[annotation id=7] content="Hint: Use the power rule" color=darkgrey size=26',
+    '[end group]',
+])
+
+
+def tweaked(tweak):
+    """Elements by id after applying the tweak's operations."""
+    operations = interpret_tweak(tweak, BOARD)
+    assert operations is not None, tweak
+    elements, diagnostics = parse(apply_patch(BOARD, operations))
+    assert not diagnostics
+    return {element.id: element for element in elements if element.id}
+
+
+def test_color_by_step_number():
+    assert tweaked("make step one blue")["2"].color == (0, 0, 255)
+
+
+def test_color_aliases_and_everything():
+    board = tweaked("turn everything dark gray")
+    assert all(board[id].color == (105, 105, 105) for id in ("1", "2", "3", "4", "6", "7"))
+
+
+def test_relative_and_absolute_size():
+    assert tweaked("make the title bigger")["1"].size == round(36 * SIZE_STEP)
+    assert tweaked("make the answer size 50")["4"].size == 50
+    assert tweaked("make the hint size 2")["7"].size == MIN_SIZE
+
+
+def test_move_by_default_step_and_to_a_point():
+    assert tweaked("move the answer down")["4"].at == (50, 240 + MOVE_STEP)
+    assert tweaked("move the answer to (400, 500)")["4"].at == (400, 500)
+
+
+def test_group_members_move_with_their_group():
+    board = tweaked("move the hint right by 30px")
+    assert board["5"].at == (80, 320)
+    assert board["7"].at is None
+
+
+def test_several_clauses():
+    board = tweaked("make the title red and the answer bigger")
+    assert board["1"].color == (255, 0, 0)
+    assert board["4"].size == round(34 * SIZE_STEP)
+
+
+@pytest.mark.parametrize("tweak", [
+    "add a graph of x^2",
+    "explain step 1 in more detail",
+    "make the title red and explain why",
+    "make step 9 blue",  # Names nothing on the board
+    "make it blue",  # No target
+    "make the title sparkle",
+])
+def test_anything_else_goes_to_the_model(tweak):
+    assert interpret_tweak(tweak, BOARD) is None
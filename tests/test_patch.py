@@ -0,0 +1,77 @@
+import pytest
+
+from patch import PatchError, apply_patch, element_id
+from syntax import parse
+
+BOARD = "\n".join([
+    '[text id=1] content="Problem: x" at=(50,50) color=black size=30',
+    '[group id=g at=(50,120)]',
+    '[text id=2] content="Step 1" color=blue size=24',
+    '[text id=3] content="Step 2" color=blue size=24',
+    '[end group]',
+    '[text id=4] content="Answer: 2x" at=(50,300) color=green size=28',
+])
+
+
+def ids(syntax):
+    return [element_id(line) for line in syntax.split("\n")]
+
+
+def test_move_and_recolor():
+    syntax = apply_patch(BOARD, [
+        {"op": "set", "id": "4", "attr": "at", "value": [80, 400]},
+        {"op": "set", "id": "1", "attr": "color", "value": "red"},
+        {"op": "set", "id": "2", "attr": "size", "value": 30},
+    ])
+    elements, diagnostics = parse(syntax)
+    assert not diagnostics
+    by_id = {element.id: element for element in elements}
+    assert by_id["4"].at == (80, 400)
+    assert by_id["1"].color == (255, 0, 0)
+    assert by_id["2"].size == 30
+    assert ids(syntax) == ids(BOARD)
+
+
+def test_set_adds_a_missing_attribute_inside_a_group_header():
+    syntax = apply_patch(BOARD, [{"op": "set", "id": "g", "attr": "color", "value": "red"}])
+    assert syntax.split("\n")[1] == "[group id=g at=(50,120) color=red]"
+
+
+def test_replace_content_escapes_quotes():
+    syntax = apply_patch(BOARD, [{"op": "replace_content", "id": "3", "content": 'Say "hi"'}])
+    elements, diagnostics = parse(syntax)
+    assert not diagnostics
+    assert elements[3].content == 'Say "hi"'
+
+
+def test_insert_after_and_delete():
+    syntax = apply_patch(BOARD, [
+        {"op": "insert_after", "id": "3", "line": '[text id=5] content="Step 3" color=blue size=24'},
+        {"op": "delete", "id": "1"},
+    ])
+    assert ids(syntax) == ["g", "2", "3", "5", None, "4"]
+    elements, _ = parse(syntax)
+    assert elements[3].group == "g"
+
+
+def test_deleting_a_group_removes_its_members():
+    syntax = apply_patch(BOARD, [{"op": "delete", "id": "g"}])
+    assert ids(syntax) == ["1", "4"]
+
+
+@pytest.mark.parametrize("operation, message", [
+    ({"op": "set", "id": "9", "attr": "color", "value": "red"}, "No element with id 9"),
+    ({"op": "move", "id": "1"}, "Unknown operation"),
+    ({"op": "set", "id": "1", "attr": "id", "value": "7"}, "Cannot set attribute"),
+    ({"op": "insert_after", "id": "1", "line": '[text id=2] content="again"'}, "already exists"),
+    ({"op": "insert_after", "id": "1", "line": "plain text"}, "needs Whiteboard Syntax lines"),
+])
+def test_invalid_operations_raise(operation, message):
+    with pytest.raises(PatchError, match=message):
+        apply_patch(BOARD, [operation])
+
+
+def test_repeated_ids_are_ambiguous():
+    board = BOARD + '\n[text id=4] content="duplicate"'
+    with pytest.raises(PatchError, match="not unique"):
+        apply_patch(board, [{"op": "delete", "id": "4"}])
@@ -0,0 +1,88 @@
+import os
+
+import pygame
+import pytest
+
+import render_cache
+
+from render_cache import PRUNE_TO, DiskStore, RenderCache
+
+
+def surface(seed, size=(32, 32)):
+    result = pygame.Surface(size, pygame.SRCALPHA)
+    result.fill((seed % 256, 0, 0, 255))
+    return result
+
+
+RECORD_BYTES = 12 + 32 * 32 * 4  # Header plus pixels of one 32x32 surface
+
+
+def age(store, key, seconds_ago):
+    path = store._path(key)
+    when = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (when, when))
+
+
+def test_disk_store_stays_within_budget(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=10 * RECORD_BYTES)
+    for n in range(30):
+        store.save(f"{n:064x}", surface(n))
+        age(store, f"{n:064x}", 100 - n)  # Older keys were used longer ago
+    on_disk = sum(size for _, size, _ in store._files())
+    assert on_disk <= 10 * RECORD_BYTES
+    assert store.current_bytes == on_disk
+    assert store.evictions == 30 - len(store._files())
+    assert store.load(f"{29:064x}") is not None  # The newest survive
+    assert store.load(f"{0:064x}") is None
+
+
+def test_load_keeps_an_entry_from_being_pruned(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=4 * RECORD_BYTES)
+    keys = [f"{n:064x}" for n in range(4)]
+    for n, key in enumerate(keys):
+        store.save(key, surface(n))
+        age(store, key, 100 - n)
+    assert store.load(keys[0]) is not None  # Now the most recently used
+    store.save(f"{4:064x}", surface(4))
+    assert store.evictions > 0
+    assert store.load(keys[0]) is not None
+    assert store.load(keys[1]) is None
+    assert store.current_bytes <= 4 * RECORD_BYTES * PRUNE_TO
+
+
+def test_budget_is_shared_with_other_processes(tmp_path):
+    first = DiskStore(str(tmp_path), max_bytes=6 * RECORD_BYTES)
+    second = DiskStore(str(tmp_path), max_bytes=6 * RECORD_BYTES)
+    for n in range(5):
+        first.save(f"{n:064x}", surface(n))
+        age(first, f"{n:064x}", 100 - n)
+    second.save(f"{5:064x}", surface(5))  # Lists the directory, including the other store's files
+    second.save(f"{6:064x}", surface(6))
+    assert sum(size for _, size, _ in second._files()) <= 6 * RECORD_BYTES
+
+
+@pytest.mark.parametrize("error", [OSError("disk full"), KeyboardInterrupt()])
+def test_failed_save_leaves_no_temp_file(tmp_path, monkeypatch, error):
+    store = DiskStore(str(tmp_path))
+
+    def fail(*args):
+        raise error
+
+    monkeypatch.setattr(render_cache.os, "replace", fail)
+    if isinstance(error, OSError):
+        store.save(f"{1:064x}", surface(1))  # Best effort: the failure is swallowed
+    else:
+        with pytest.raises(KeyboardInterrupt):
+            store.save(f"{1:064x}", surface(1))
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == []
+    assert store.load(f"{1:064x}") is None
+
+
+def test_render_cache_reports_disk_evictions(tmp_path):
+    cache = RenderCache("latex", cache_dir=str(tmp_path), disk_bytes=3 * RECORD_BYTES)
+    for n in range(6):
+        cache.put(cache.key(n), surface(n))
+    stats = cache.stats()
+    assert stats["disk_evictions"] > 0
+    assert 0 < stats["disk_bytes"] <= 3 * RECORD_BYTES
+    assert RenderCache("latex", cache_dir="").stats()["disk_evictions"] == 0
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def cache_with_clock(monkeypatch, **limits):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=clock))
+    return ResponseCache(":memory:", **limits), clock
+
+
+def test_empty_cache_dir_keeps_responses_in_memory():
+    # conftest.py sets WHITEBOARD_CACHE_DIR to "" before the module is imported
+    assert response_cache.DEFAULT_PATH == ":memory:"
+
+
+def test_hits_and_misses_are_counted(monkeypatch):
+    cache, _ = cache_with_clock(monkeypatch)
+    assert cache.get("a") is None
+    cache.put("a", "alpha")
+    assert cache.get("a") == "alpha"
+    assert cache.get("a") == "alpha"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, ttl=60)
+    cache.put("a", "alpha")
+    clock.now += 59
+    assert cache.get("a") == "alpha"
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.evictions == 1
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, max_entries=5)
+    for n in range(5):
+        cache.put(str(n), "value")
+        clock.now += 1
+    assert cache.get("0") == "value"  # Now the most recently used
+    clock.now += 1
+    cache.put("5", "value")  # Over the limit: prune to PRUNE_TO of it
+    kept = int(5 * response_cache.PRUNE_TO)
+    assert cache.stats()["entries"] == kept
+    assert cache.evictions == 6 - kept
+    assert cache.get("0") == "value" and cache.get("5") == "value"
+    assert cache.get("1") is None
+
+
+def test_byte_limit_and_replaced_values(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, max_bytes=100)
+    cache.put("a", "x" * 40)
+    cache.put("a", "x" * 40)  # Replacing an entry does not count its size twice
+    clock.now += 1
+    cache.put("b", "x" * 40)
+    assert cache.stats()["bytes"] == 80
+    clock.now += 1
+    cache.put("c", "x" * 40)
+    assert cache.stats()["bytes"] <= 100 * response_cache.PRUNE_TO
+    assert cache.get("c") is not None and cache.get("a") is None
+
+
+def test_puts_below_the_limits_do_not_scan(monkeypatch):
+    cache, _ = cache_with_clock(monkeypatch, max_entries=1000)
+    calls = []
+    monkeypatch.setattr(cache, "_evict", lambda now: calls.append(now))
+    for n in range(200):
+        cache.put(str(n), "value")
+    assert not calls
+    assert cache.stats()["entries"] == 200
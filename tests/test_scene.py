@@ -0,0 +1,92 @@
+import pygame
+
+from render import render_whiteboard
+from scene import MIP_LEVELS, Scene, element_keys
+from syntax import parse
+
+BOARD = (
+    '[text id=1] content="Problem: one" at=(50,40) color=darkred size=30\n'
+    '[math id=2] content="$x^2$" at=(50,100) color=blue size=28\n'
+    '[text id=3] content="Answer: two" at=(50,180) color=green size=24'
+)
+
+
+def pixels(surface):
+    return pygame.image.tobytes(surface, "RGBA")
+
+
+def test_unchanged_and_moved_elements_keep_their_layers():
+    scene = Scene(800, mode="absolute")
+    elements, _ = parse(BOARD)
+    layers, _, _ = scene.arrange(elements)
+    assert (scene.rasterized, scene.reused) == (3, 0)
+
+    moved, _ = parse(BOARD.replace("at=(50,180)", "at=(50,400)"))
+    moved_layers, positions, _ = scene.arrange(moved)
+    assert (scene.rasterized, scene.reused) == (0, 3)
+    assert moved_layers[2] is layers[2]
+    assert positions[2] == (50, 400)
+
+    # A horizontal move narrows the width text wraps to, so that layer is redrawn
+    shifted, _ = parse(BOARD.replace("at=(50,180)", "at=(300,400)"))
+    scene.arrange(shifted)
+    assert (scene.rasterized, scene.reused) == (1, 2)
+
+
+def test_only_changed_elements_are_rasterized():
+    scene = Scene(800, mode="absolute")
+    elements, _ = parse(BOARD)
+    layers, _, _ = scene.arrange(elements)
+    recolored, _ = parse(BOARD.replace("color=green", "color=purple"))
+    new_layers, _, _ = scene.arrange(recolored)
+    assert (scene.rasterized, scene.reused) == (1, 2)
+    assert new_layers[:2] == layers[:2] and new_layers[2] is not layers[2]
+
+
+def test_removed_elements_are_dropped_and_repeated_ids_kept_apart():
+    scene = Scene(800, mode="absolute")
+    elements, _ = parse(BOARD + '\n[text id=1] content="Repeated id" at=(50,260) size=24')
+    assert element_keys(elements)[0] != element_keys(elements)[3]
+    scene.arrange(elements)
+    assert scene.rasterized == 4
+    scene.arrange(elements[:2])
+    assert set(scene._layers) == set(element_keys(elements[:2]))
+
+
+def test_apply_matches_a_full_render():
+    elements, _ = parse(BOARD)
+    scene = Scene(800)
+    scene.apply(parse(BOARD.replace("Answer", "Old answer"))[0])
+    surface, height = scene.apply(elements)  # Mostly reused layers
+    expected, expected_height = render_whiteboard(elements, 800)
+    assert height == expected_height
+    assert pixels(surface) == pixels(expected)
+
+
+def test_zoom_levels_are_an_lru_of_mip_levels():
+    scene = Scene(800, mode="absolute")
+    elements, _ = parse(BOARD)
+    scene.arrange(elements)
+    scales = [1.5, 2.0, 3.0]
+    assert len(scales) == MIP_LEVELS
+    for scale in scales:
+        scene.arrange(elements, scale)
+        assert scene.rasterized == 3
+
+    layers, positions, _ = scene.arrange(elements, 1.5)  # Still cached
+    assert scene.rasterized == 0
+    assert positions[1] == (75, 150)
+
+    scene.arrange(elements, 4.0)  # Evicts 2.0, the least recently used level
+    assert all(list(levels) == [3.0, 1.5, 4.0] for levels in scene._mips.values())
+    scene.arrange(elements, 2.0)
+    assert scene.rasterized == 3
+
+
+def test_zoomed_layers_are_larger():
+    scene = Scene(800, mode="absolute")
+    elements, _ = parse(BOARD)
+    layers, _, height = scene.arrange(elements)
+    zoomed, _, zoomed_height = scene.arrange(elements, 2.0)
+    assert zoomed[0].get_height() > layers[0].get_height() * 1.5
+    assert zoomed_height == height * 2
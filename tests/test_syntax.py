@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+from bench_parse import SAMPLE_LINES
+from syntax import COLORS, Parser, _fast_element, parse
+
+FIELDS = ("type", "id", "content", "color", "size", "at", "attrs")
+
+LINES = [line.format(n=n, y=50 + 40 * n) for n, line in enumerate(SAMPLE_LINES)] + [
+    '[graph id=9] equation="x**2" domain=(-10,10) at=(50,200) color=green size=300',
+    '[graph id=10 equation=sin(x) domain=(0,6) size=200]',
+    '  [text id=11] content="Say \\"hi\\"" at=(-5, 7) color=#ff8800 size=24',
+    '[TEXT id=12] content="caps" color=Gray size=20.0',
+    '[text id=13 content="inline header" at=(1,2)]',
+    '[math id=14] content="$x$" size=0',
+    '[text id=15] content="unterminated at=(1,2)',
+    '[text id=16] content="x" at=(1,2',
+    '[text id=17] content="x" color=nope',
+    '[text id=18] content= size=20',
+    '[text id=19 key=] content="x"',
+    '[text id=20 key=]"x" size=20',
+    '[end group]',
+    '# a comment',
+    '',
+    'stray text',
+]
+# Characters that tend to move a line between the fast path and the full scan
+NOISE = ' []()="\\,=-.#_0123456789abcXYZ\t'
+
+
+def fields(element):
+    return tuple(getattr(element, name) for name in FIELDS)
+
+
+def mutate(line, rng):
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(line) + 1)
+        action = rng.randrange(3)
+        if action == 0 and line:
+            line = line[:position] + line[position + 1:]
+        elif action == 1:
+            line = line[:position] + rng.choice(NOISE) + line[position:]
+        else:
+            start = rng.randrange(len(line) + 1)
+            line = line[:position] + line[start:start + rng.randint(1, 8)] + line[position:]
+    return line
+
+
+def test_fast_path_matches_full_scan():
+    rng = random.Random(17)
+    accepted = 0
+    for _ in range(40000):
+        line = mutate(rng.choice(LINES), rng)
+        fast = _fast_element(line)
+        if fast is None:
+            continue
+        accepted += 1
+        parser = Parser()
+        scanned = parser._scan(line, 1)
+        assert scanned is not None, line
+        assert fields(fast) == fields(scanned), line
+        assert not parser.diagnostics, (line, parser.diagnostics)
+    assert accepted > 2000  # The fast path is exercised, not just bypassed
+
+
+@pytest.mark.parametrize("line", [line for line in LINES if _fast_element(line) is not None])
+def test_fast_path_matches_full_scan_on_samples(line):
+    parser = Parser()
+    assert fields(_fast_element(line)) == fields(parser._scan(line, 1))
+    assert not parser.diagnostics
+
+
+def test_typed_fields():
+    elements, diagnostics = parse(
+        '[text id=1] content="Say \\"hi\\"" at=(-5, 7) color=#ff8800 size=24\n'
+        '[graph id=2] equation=5 domain=(0,1) color=grey size=300'
+    )
+    assert not diagnostics
+    text, graph = elements
+    assert (text.content, text.at, text.color, text.size) == ('Say "hi"', (-5, 7), (255, 136, 0), 24)
+    assert graph.attrs == {"equation": "5", "domain": (0, 1)}
+    assert graph.color == COLORS["grey"]
+
+
+def test_groups_and_diagnostics():
+    elements, diagnostics = parse(
+        '[group id=6 at=(50,420)]\n'
+        '[text id=7] content="inside"\n'
+        '[end group]\n'
+        '[text id=8] content="x" color=nope\n'
+        'stray text\n'
+        '[end group]\n'
+        '[group id=9]'
+    )
+    assert [element.group for element in elements] == [None, "6", None, None, None, None]
+    assert [(d.line, d.severity) for d in diagnostics] == [
+        (4, "warning"), (5, "error"), (6, "warning"), (7, "warning"),
+    ]
+    assert "unknown color" in diagnostics[0].message
+    assert "never closed" in diagnostics[-1].message
+
+
+def test_feed_matches_parse():
+    board = "\n".join(LINES)
+    parser = Parser()
+    for line in board.split("\n"):
+        parser.feed(line)
+    streamed, streamed_diagnostics = parser.close()
+    elements, diagnostics = parse(board)
+    assert [fields(e) for e in streamed] == [fields(e) for e in elements]
+    assert [str(d) for d in streamed_diagnostics] == [str(d) for d in diagnostics]
@@ -0,0 +1,85 @@
+import pygame
+import pytest
+
+from render import paint
+from scene import Scene
+from syntax import parse
+from viewport import TiledCanvas
+
+WIDTH = 600
+VIEW_HEIGHT = 300
+
+
+@pytest.fixture(scope="module")
+def board():
+    syntax = "\n".join(f'[text id={n}] content="Line {n} of a tall board" color=blue size=24' for n in range(60))
+    layers, positions, height = Scene(WIDTH, mode="flow").arrange(parse(syntax)[0])
+    return layers, positions, height
+
+
+def on_white(source, top):
+    """The rows top..top + VIEW_HEIGHT of source over an opaque white view."""
+    view = pygame.Surface((WIDTH, VIEW_HEIGHT))
+    view.fill((255, 255, 255))
+    view.blit(source, (0, -top))
+    return pygame.image.tobytes(view, "RGB")
+
+
+def drawn(canvas, top):
+    view = pygame.Surface((WIDTH, VIEW_HEIGHT))
+    view.fill((255, 255, 255))
+    canvas.draw(view, (0, 0), top, VIEW_HEIGHT)
+    return pygame.image.tobytes(view, "RGB")
+
+
+@pytest.mark.parametrize("top", [0, 100, 127, 128, 1000])
+def test_draw_matches_a_full_paint(board, top):
+    layers, positions, height = board
+    full = paint(layers, positions, WIDTH, height)
+    canvas = TiledCanvas(WIDTH, height, layers, positions, tile_height=128)
+    expected = on_white(full, top)
+    assert expected != b"\xff" * len(expected)  # The view shows text, not just background
+    assert drawn(canvas, top) == expected
+
+
+def test_tiles_stay_within_budget_and_repaint_the_same(board):
+    layers, positions, height = board
+    full = paint(layers, positions, WIDTH, height)
+    tile_bytes = WIDTH * 128 * 4
+    canvas = TiledCanvas(WIDTH, height, layers, positions, tile_height=128, max_bytes=4 * tile_bytes)
+    assert canvas.tile_count > 8
+    for top in range(0, height - VIEW_HEIGHT, 64):
+        canvas.draw(pygame.Surface((WIDTH, VIEW_HEIGHT)), (0, 0), top, VIEW_HEIGHT)
+        assert canvas.tiles.current_bytes <= 4 * tile_bytes
+    painted = canvas.painted
+    assert drawn(canvas, 0) == on_white(full, 0)  # Evicted long ago, painted again
+    assert canvas.painted > painted
+
+
+def test_prefetch_paints_the_next_tile_only(board):
+    layers, positions, height = board
+    canvas = TiledCanvas(WIDTH, height, layers, positions, tile_height=128)
+    canvas.draw(pygame.Surface((WIDTH, VIEW_HEIGHT)), (0, 0), 0, VIEW_HEIGHT)
+    visible = -(-VIEW_HEIGHT // 128)
+    assert canvas.painted == visible + 1
+    assert canvas.tiles.get(visible) is not None and canvas.tiles.get(visible + 1) is None
+
+
+def test_nothing_is_drawn_outside_the_view(board):
+    layers, positions, height = board
+    canvas = TiledCanvas(WIDTH, height, layers, positions, tile_height=128)
+    target = pygame.Surface((WIDTH, 3 * VIEW_HEIGHT))
+    target.fill((255, 0, 0))
+    rects = canvas.draw(target, (0, VIEW_HEIGHT), 0, VIEW_HEIGHT)
+    view = pygame.Rect(0, VIEW_HEIGHT, WIDTH, VIEW_HEIGHT)
+    assert rects and all(view.contains(rect.clip(view)) for rect in rects)
+    assert target.get_at((5, VIEW_HEIGHT - 1))[:3] == (255, 0, 0)
+    assert target.get_at((5, 2 * VIEW_HEIGHT))[:3] == (255, 0, 0)
+
+
+def test_zoomed_draw_fills_the_view(board):
+    layers, positions, height = board
+    canvas = TiledCanvas(WIDTH, height, layers, positions, tile_height=128)
+    target = pygame.Surface((WIDTH, VIEW_HEIGHT))
+    [rect] = canvas.draw(target, (0, 0), 0, VIEW_HEIGHT, zoom=2.0)
+    assert rect.size == (WIDTH, VIEW_HEIGHT)
@@ -0,0 +1,155 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import pygame
+
+# Preamble compiled once into a TeX format so jobs skip package loading
+PREAMBLE = r"""\documentclass{article}
+\usepackage{type1cm}
+\usepackage{amsmath}
+\usepackage{amssymb}
+\usepackage{xcolor}
+\pagestyle{empty}
+\setlength{\parindent}{0pt}
+"""
+
+FORMAT_NAME = "wbpreamble"
+TEX_TIMEOUT = 30  # Seconds before a hung TeX job is abandoned
+
+
+def tex_available():
+    """True when both latex and dvipng are on PATH."""
+    return shutil.which("latex") is not None and shutil.which("dvipng") is not None
+
+
+class TexError(Exception):
+    pass
+
+
+class _TexWorker:
+    """A reusable TeX working directory with the precompiled format on its search path."""
+
+    def __init__(self, format_dir):
+        self.directory = tempfile.mkdtemp(prefix="wb-tex-")
+        self.env = dict(os.environ, TEXFORMATS=format_dir + os.pathsep)
+
+    def run(self, formulas, dpi):
+        """Typeset formulas as one DVI (one page each) and rasterize every page."""
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+        pages = []
+        for content, size, color in formulas:
+            r, g, b = color
+            pages.append(
+                f"\\fontsize{{{size}}}{{{size * 1.25:g}}}\\selectfont"
+                f"\\color[RGB]{{{r},{g},{b}}}{content}\\newpage"
+            )
+        document = "\\begin{document}\n" + "\n".join(pages) + "\n\\end{document}\n"
+        with open(os.path.join(self.directory, "job.tex"), "w", encoding="utf-8") as f:
+            f.write(document)
+
+        latex = subprocess.run(
+            ["latex", "-interaction=nonstopmode", f"-fmt={FORMAT_NAME}", "job.tex"],
+            cwd=self.directory, env=self.env, capture_output=True, timeout=TEX_TIMEOUT,
+        )
+        if latex.returncode != 0:
+            raise TexError(latex.stdout.decode("utf-8", "replace")[-2000:])
+
+        dvipng = subprocess.run(
+            ["dvipng", "-q", "-D", str(dpi), "-T", "tight", "-bg", "Transparent",
+             "-z", "1", "-o", "page%d.png", "job.dvi"],
+            cwd=self.directory, env=self.env, capture_output=True, timeout=TEX_TIMEOUT,
+        )
+        if dvipng.returncode != 0:
+            raise TexError(dvipng.stderr.decode("utf-8", "replace")[-2000:])
+
+        surfaces = []
+        for page in range(1, len(formulas) + 1):
+            path = os.path.join(self.directory, f"page{page}.png")
+            if not os.path.exists(path):
+                raise TexError(f"dvipng produced no output for page {page}")
+            surfaces.append(pygame.image.load(path))
+        return surfaces
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class TexEngine:
+    """Pool of warm TeX workers that typeset whole boards in a single job.
+
+    The preamble is dumped into a format file once, so every job starts with
+    packages already loaded; workers keep their directories between jobs and
+    are handed out to concurrent callers (e.g. separate Streamlit sessions).
+    """
+
+    def __init__(self, workers=2):
+        self.format_dir = tempfile.mkdtemp(prefix="wb-texfmt-")
+        self._compile_format()
+        self._idle = queue.Queue()
+        self._workers = [_TexWorker(self.format_dir) for _ in range(workers)]
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def _compile_format(self):
+        with open(os.path.join(self.format_dir, "preamble.tex"), "w", encoding="utf-8") as f:
+            f.write(PREAMBLE + "\\dump\n")
+        result = subprocess.run(
+            ["latex", "-ini", "-interaction=nonstopmode", f"-jobname={FORMAT_NAME}",
+             "&latex", "preamble.tex"],
+            cwd=self.format_dir, capture_output=True, timeout=TEX_TIMEOUT * 2,
+        )
+        if not os.path.exists(os.path.join(self.format_dir, FORMAT_NAME + ".fmt")):
+            raise TexError("Could not build TeX format: " + result.stdout.decode("utf-8", "replace")[-2000:])
+
+    def render(self, formulas, dpi):
+        """Render [(content, size, color), ...] to surfaces; None marks formulas TeX rejected."""
+        if not formulas:
+            return []
+        worker = self._idle.get()
+        try:
+            try:
+                return worker.run(formulas, dpi)
+            except (TexError, subprocess.TimeoutExpired):
+                if len(formulas) == 1:
+                    return [None]
+            # A bad formula poisons the batch; retry one by one to isolate it
+            surfaces = []
+            for formula in formulas:
+                try:
+                    surfaces.extend(worker.run([formula], dpi))
+                except (TexError, subprocess.TimeoutExpired):
+                    surfaces.append(None)
+            return surfaces
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        shutil.rmtree(self.format_dir, ignore_errors=True)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_engine_failed = False
+
+
+def get_engine():
+    """Shared TexEngine, or None when TeX is not installed or the format fails to build."""
+    global _engine, _engine_failed
+    with _engine_lock:
+        if _engine is None and not _engine_failed:
+            if not tex_available():
+                _engine_failed = True
+            else:
+                try:
+                    _engine = TexEngine()
+                except (TexError, OSError, subprocess.TimeoutExpired):
+                    _engine_failed = True
+        return _engine
@@ -0,0 +1,130 @@
+from bisect import bisect_left, bisect_right
+
+import math
+
+import pygame
+
+from render_cache import SurfaceLRU
+
+# Height of one tile; a 1480 px wide tile is about 3 MB
+TILE_HEIGHT = 512
+# Memory budget for painted tiles, whatever the height of the board
+TILE_CACHE_BYTES = 24 * 1024 * 1024
+# Tiles beyond the viewport, in the scroll direction, painted ahead of time
+PREFETCH_TILES = 2
+
+
+class TiledCanvas:
+    """A board of any height, painted in fixed-height tiles only as they are needed.
+
+    Takes the layers and positions of a laid-out board (see Scene.arrange)
+    instead of one surface the size of the board. draw() paints the tiles
+    under the viewport, keeps them in an LRU bounded by max_bytes, and
+    paints at most one tile ahead in the direction of scrolling per call,
+    so memory and frame time stay flat however long the board grows.
+
+    scale is the zoom the layers were rasterized at. Drawing at another
+    zoom stretches the visible rows of this raster, which is cheap enough
+    for every frame of a zoom gesture while a sharp raster is prepared.
+    """
+
+    def __init__(self, width, height, layers, positions, scale=1.0, tile_height=TILE_HEIGHT,
+                 max_bytes=TILE_CACHE_BYTES, prefetch=PREFETCH_TILES):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.tile_height = tile_height
+        self.prefetch = prefetch
+        self.tiles = SurfaceLRU(max_bytes)
+        self._empty = set()  # Tiles no layer reaches; drawn as nothing
+        self._direction = 1  # Last scroll direction: 1 down, -1 up
+        self._top = 0
+        self.painted = 0  # Tiles painted so far, including repaints after eviction
+
+        # Layers sorted by top edge, so a tile finds the layers it overlaps by bisection
+        placed = sorted(
+            ((position[1], position[0], layer) for layer, position in zip(layers, positions)
+             if layer is not None and position is not None),
+            key=lambda item: item[0],
+        )
+        self._tops = [top for top, _, _ in placed]
+        self._placed = placed
+        self._tallest = max((layer.get_height() for _, _, layer in placed), default=0)
+
+    @property
+    def tile_count(self):
+        return -(-self.height // self.tile_height)
+
+    def _paint(self, index):
+        top = index * self.tile_height
+        bottom = min(top + self.tile_height, self.height)
+        start = bisect_left(self._tops, top - self._tallest)
+        end = bisect_right(self._tops, bottom - 1)
+        overlapping = [
+            (y, x, layer) for y, x, layer in self._placed[start:end] if y + layer.get_height() > top
+        ]
+        if not overlapping:
+            self._empty.add(index)
+            return None
+        tile = pygame.Surface((self.width, bottom - top), pygame.SRCALPHA)
+        tile.fill((255, 255, 255, 0))
+        for y, x, layer in overlapping:
+            tile.blit(layer, (x, y - top))
+        self.tiles.put(index, tile)
+        self.painted += 1
+        return tile
+
+    def tile(self, index):
+        """The painted tile at index, or None when nothing is drawn there."""
+        if index in self._empty:
+            return None
+        tile = self.tiles.get(index)
+        return tile if tile is not None else self._paint(index)
+
+    def draw(self, surface, dest, top, height, left=0, zoom=None):
+        """Show the board on surface at dest, scrolled to top and left, in a view height pixels tall.
+
+        top and left are in display pixels at zoom (default: this canvas's
+        own scale). The view runs to the right edge of surface, and nothing
+        is drawn outside it. Returns the rects drawn.
+        """
+        view = pygame.Rect(dest[0], dest[1], surface.get_width() - dest[0], height)
+        ratio = 1.0 if zoom is None else zoom / self.scale
+        clip = surface.get_clip()
+        surface.set_clip(clip.clip(view))
+        try:
+            if abs(ratio - 1.0) < 1e-9:
+                return self._blit_rows(surface, view.x - left, view.y, top, height)
+            # Stretch the raster rows under the view into it
+            source = pygame.Surface(
+                (math.ceil(view.width / ratio), math.ceil(height / ratio)), pygame.SRCALPHA
+            )
+            source.fill((255, 255, 255, 0))
+            self._blit_rows(source, -round(left / ratio), 0, round(top / ratio), source.get_height())
+            return [surface.blit(pygame.transform.scale(source, view.size), view)]
+        finally:
+            surface.set_clip(clip)
+
+    def _blit_rows(self, surface, x, y, top, height):
+        """Blit the tiles covering rows top..top + height with row top at (x, y), then prefetch one."""
+        if top != self._top:
+            self._direction = 1 if top > self._top else -1
+            self._top = top
+        first = max(0, top // self.tile_height)
+        last = min(self.tile_count - 1, (top + height - 1) // self.tile_height)
+        rects = []
+        for index in range(first, last + 1):
+            tile = self.tile(index)
+            if tile is not None:
+                rects.append(surface.blit(tile, (x, y + index * self.tile_height - top)))
+
+        # Paint the next tile the scroll is heading for, one per frame
+        if self._direction > 0:
+            ahead = range(last + 1, last + 1 + self.prefetch)
+        else:
+            ahead = range(first - 1, first - 1 - self.prefetch, -1)
+        for index in ahead:
+            if 0 <= index < self.tile_count and index not in self._empty and self.tiles.get(index) is None:
+                self._paint(index)
+                break
+        return rects